@@ -79,7 +79,7 @@ ls2d.download_cams(settings, variables=cams_vars, grid=0.25)
 # Read, average over 3x3 grid points, and interpolate on LES grid.
 cams = ls2d.Read_cams(settings, variables=cams_vars)
 
-z = np.arange(10, 5000, 20).astype(float)
+z = np.arange(10., 5000., 20.)
 les_input = cams.get_les_input(z, n_av=1)
 
 les_input.to_netcdf('ls2d_cams.nc')
@@ -55,56 +55,29 @@ era = ls2d.Read_era5(settings)
 era.calculate_forcings(n_av=1, method='2nd')
 
 # Interpolate ERA5 to fixed height grid:
-z = np.arange(10, 5000, 20).astype(float)
+z = np.arange(10., 5000., 20.)
 les_input = era.get_les_input(z)
 
 # `les_input` is an xarray.Dataset, which can easily be save to NetCDF:
 les_input.to_netcdf('ls2d_era5.nc')
 
 # Plot variables as example:
-nrow = 5
-ncol = 2
-sp = 1
-
-pl.figure(figsize=(8,8))
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['thl'].T, les_input['z'])
-pl.xlabel(r'$\theta_l$ (K)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['dtthl_advec'].T*3600, les_input['z'])
-pl.xlabel(r'$\partial \theta_l/\partial t$ advec (K h$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['qt'].T*1e3, les_input['z'])
-pl.xlabel(r'$q_t$ (g kg$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['dtqt_advec'].T*3600000, les_input['z'])
-pl.xlabel(r'$\partial q_t/\partial t$ advec (g kg$^{-1}$ h$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['u'].T, les_input['z'])
-pl.xlabel(r'$u$ (m s$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['dtu_advec'].T*3600, les_input['z'])
-pl.xlabel(r'$\partial u/\partial t$ advec (m s$^{-1}$ h$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['v'].T, les_input['z'])
-pl.xlabel(r'$v$ (m s$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['dtv_advec'].T*3600, les_input['z'])
-pl.xlabel(r'$\partial v/\partial t$ advec (m s$^{-1}$ h$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['ug'].T, les_input['z'])
-pl.xlabel(r'$u_g$ (m s$^{-1}$)')
-
-pl.subplot(nrow, ncol, sp); sp+=1
-pl.plot(les_input['vg'].T, les_input['z'])
-pl.xlabel(r'$v_g$ (m s$^{-1}$)')
+# (variable name, scale factor, label)
+plot_vars = [
+    ('thl',         1,       r'$\theta_l$ (K)'),
+    ('dtthl_advec', 3600,    r'$\partial \theta_l/\partial t$ advec (K h$^{-1}$)'),
+    ('qt',          1e3,     r'$q_t$ (g kg$^{-1}$)'),
+    ('dtqt_advec',  3600000, r'$\partial q_t/\partial t$ advec (g kg$^{-1}$ h$^{-1}$)'),
+    ('u',           1,       r'$u$ (m s$^{-1}$)'),
+    ('dtu_advec',   3600,    r'$\partial u/\partial t$ advec (m s$^{-1}$ h$^{-1}$)'),
+    ('v',           1,       r'$v$ (m s$^{-1}$)'),
+    ('dtv_advec',   3600,    r'$\partial v/\partial t$ advec (m s$^{-1}$ h$^{-1}$)'),
+    ('ug',          1,       r'$u_g$ (m s$^{-1}$)'),
+    ('vg',          1,       r'$v_g$ (m s$^{-1}$)')]
+
+fig, axes = pl.subplots(5, 2, sharey=True, figsize=(8,8))
+for ax, (name, scale, label) in zip(axes.flat, plot_vars):
+    ax.plot(les_input[name].values.T*scale, z)
+    ax.set_xlabel(label)
 
 pl.tight_layout()
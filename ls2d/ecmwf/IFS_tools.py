@@ -25,6 +25,32 @@ import os
 # Third party modules
 import numpy as np
 
+# LS2D modules
+from ls2d.src.jit import njit, prange, has_numba
+
+
+@njit(parallel=True, cache=True)
+def _calc_half_level_pressure_Zg(ps, Tv, a, b, Rd, grav, ph, zh):
+    """
+    Numba kernel of `IFS_tools.calc_half_level_pressure_Zg()`,
+    integrating each (time, lat, lon) column in parallel.
+    """
+    nt, nfull, nlat, nlon = Tv.shape
+
+    for n in prange(nt*nlat*nlon):
+        t = n // (nlat*nlon)
+        j = (n // nlon) % nlat
+        i = n % nlon
+
+        for k in range(nfull+1):
+            ph[t,k,j,i] = a[k] + b[k] * ps[t,j,i]
+        ph[t,nfull,j,i] = 0.34
+
+        zh[t,0,j,i] = 0.
+        for k in range(nfull):
+            zh[t,k+1,j,i] = zh[t,k,j,i] - Rd * Tv[t,k,j,i] * np.log(ph[t,k+1,j,i] / ph[t,k,j,i]) / grav
+
+
 class IFS_tools:
     """
     Various tools to calculate e.g. properties of the vertical IFS/ERA grid,
@@ -74,10 +100,14 @@ class IFS_tools:
         Equation: p = a + b * ps
         Top value is set to a small non-zero number to prevent div-by-0's
         Keyword arguments: 
-            ps -- surface pressure (Pa)
+            ps -- surface pressure (Pa), scalar or array. For arrays,
+                  the half levels are added as a new first dimension.
         """
 
-        ph = self.a + self.b * ps
+        ps = np.asarray(ps)
+        shape = (self.a.size,) + (1,)*ps.ndim
+
+        ph = self.a.reshape(shape) + self.b.reshape(shape) * ps
         ph[-1] = 0.34     # Chosen to match IFS values for standard atmosphere
         return ph
 
@@ -101,15 +131,44 @@ class IFS_tools:
         Keyword arguments: 
             ph -- half level pressure (Pa)
             Tv -- full level virtual temperature (K) 
-    `    """
+        Both can have additional dimensions, with the levels as first dimension.
+        """
 
         pfrac = ph[1:] / ph[:-1]
         dZg   = -self.Rd * Tv * np.log(pfrac) / self.grav
-        Zg    = np.cumsum(dZg) 
-        Zg    = np.insert(Zg, 0, 0) 
+        Zg    = np.concatenate((np.zeros_like(dZg[:1]), np.cumsum(dZg, axis=0)), axis=0)
 
         return Zg
 
+    def calc_half_level_pressure_Zg(self, ps, Tv):
+        """
+        Calculate half level pressure and geopotential height of 3D fields.
+        Uses Numba (if available), otherwise the vectorised NumPy functions.
+        Keyword arguments:
+            ps -- surface pressure (Pa), shape (time, lat, lon)
+            Tv -- full level virtual temperature (K), shape (time, level, lat, lon)
+        Returns:
+            ph, zh -- half level pressure (Pa) and height (m), shape (time, half level, lat, lon)
+        """
+
+        if has_numba:
+            shape = (Tv.shape[0], Tv.shape[1]+1, Tv.shape[2], Tv.shape[3])
+            ph = np.empty(shape)
+            zh = np.empty(shape)
+
+            _calc_half_level_pressure_Zg(
+                    np.ascontiguousarray(ps, dtype=np.float64),
+                    np.ascontiguousarray(Tv, dtype=np.float64),
+                    self.a, self.b, self.Rd, self.grav, ph, zh)
+
+            return ph, zh
+        else:
+            # The IFS tools work with the levels as first dimension: (height, time, lat, lon).
+            ph = self.calc_half_level_pressure(ps)
+            zh = self.calc_half_level_Zg(ph, np.moveaxis(Tv, 1, 0))
+
+            return np.moveaxis(ph, 0, 1), np.moveaxis(zh, 0, 1)
+
     def calc_full_level_Zg(self, ph, Tv):
         """
         Calculate full level geopotential height
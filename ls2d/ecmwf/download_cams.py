@@ -30,6 +30,7 @@ import yaml
 # Third party modules
 import xarray as xr
 import numpy as np
+import dask
 
 # LS2D modules
 import ls2d.ecmwf.era_tools as era_tools
@@ -87,9 +88,10 @@ def regrid(nc_file, central_lon, central_lat, resolution):
     dsi.to_netcdf(nc_file)
 
 
-def _download_cams_file(settings, variables, grid):
+def _download_cams_file(settings, variables):
     """
-    Download single CAMS file.
+    Download single CAMS file. Returns the path of the
+    NetCDF file, or None if the download is not (yet) finished.
     """
     header('Downloading: {} - {}'.format(settings['date'], settings['ftype']))
 
@@ -110,106 +112,122 @@ def _download_cams_file(settings, variables, grid):
             settings['date'].year, settings['date'].month, settings['date'].day,
             settings['cams_path'], settings['case_name'], settings['ftype'])
 
-    # Write CDS API prints to log file (NetCDF file path/name appended with .out/.err)
+    # Write CDS API output to log file (NetCDF file path/name appended with .log)
     if settings['write_log']:
-        out_file   = '{}.out'.format(nc_file[:-3])
-        err_file   = '{}.err'.format(nc_file[:-3])
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = open(out_file, 'w')
-        sys.stderr = open(err_file, 'w')
+        logger, log_handler = era_tools.get_file_logger(nc_file, '{}.log'.format(nc_file[:-3]))
+        log_callbacks = {
+                'info_callback': logger.info,
+                'warning_callback': logger.warning,
+                'error_callback': logger.error}
+    else:
+        log_callbacks = {}
 
-    # Bounds of domain
-    lat_n = settings['central_lat']+settings['area_size']
-    lat_s = settings['central_lat']-settings['area_size']
-    lon_w = settings['central_lon']-settings['area_size']
-    lon_e = settings['central_lon']+settings['area_size']
+    try:
+        # Bounds of domain
+        lat_n = settings['central_lat']+settings['area_size']
+        lat_s = settings['central_lat']-settings['area_size']
+        lon_w = settings['central_lon']-settings['area_size']
+        lon_e = settings['central_lon']+settings['area_size']
 
-    # Check if pickle with previous request is available.
-    # If so, try to download NetCDF file, if not, submit new request
-    pickle_file = '{}.pickle'.format(nc_file[:-3])
+        # Check if pickle with previous request is available.
+        # If so, try to download NetCDF file, if not, submit new request
+        pickle_file = '{}.pickle'.format(nc_file[:-3])
 
-    if os.path.isfile(pickle_file):
-        message('Found previous CDS request!')
+        if os.path.isfile(pickle_file):
+            message('Found previous CDS request!')
 
-        with open(pickle_file, 'rb') as f:
-            cds_request = pickle.load(f)
+            with open(pickle_file, 'rb') as f:
+                cds_request = pickle.load(f)
 
-            try:
-                cds_request.update()
-            except requests.exceptions.HTTPError:
-                error('CDS request is no longer available online!', exit=False)
-                error('To continue, delete the previous request: {}'.format(pickle_file))
+                try:
+                    cds_request.update()
+                except requests.exceptions.HTTPError:
+                    error('CDS request is no longer available online!', exit=False)
+                    error('To continue, delete the previous request: {}'.format(pickle_file))
 
-            state = cds_request.reply['state']
+                state = cds_request.reply['state']
 
-            if state == 'completed':
-                message('Request finished, downloading NetCDF file')
+                if state == 'completed':
+                    message('Request finished, downloading NetCDF file')
 
-                cds_request.download(nc_file)
-                os.remove(pickle_file)
+                    cds_request.download(nc_file)
+                    os.remove(pickle_file)
 
-                patch_netcdf(nc_file)
+                    finished = True
 
-                if grid is not None:
-                    message(f'Re-gridding NetCDF to {grid:.2f}°×{grid:.2f}° degree grid.')
-                    regrid(nc_file, settings['central_lon'], settings['central_lat'], grid)
+                elif state in ('accepted', 'queued', 'running'):
+                    message('Request not finished, current status = \"{}\"'.format(state))
 
-                finished = True
+                else:
+                    error('Request failed, status = \"{}\"'.format(state), exit=False)
+                    message('Error message = {}'.format(cds_request.reply['error'].get('message')))
+                    message('Error reason = {}'.format(cds_request.reply['error'].get('reason')))
 
-            elif state in ('accepted', 'queued', 'running'):
-                message('Request not finished, current status = \"{}\"'.format(state))
 
-            else:
-                error('Request failed, status = \"{}\"'.format(state), exit=False)
-                message('Error message = {}'.format(cds_request.reply['error'].get('message')))
-                message('Error reason = {}'.format(cds_request.reply['error'].get('reason')))
+        else:
+            message('No previous CDS request, submitting new one')
 
+            # Create instance of CDS API
+            server = cdsapi.Client(
+                    url=credentials['url_ads'], key=credentials['key_ads'], verify=True,
+                    wait_until_complete=False, delete=False, **log_callbacks)
 
-    else:
-        message('No previous CDS request, submitting new one')
-
-        # Create instance of CDS API
-        server = cdsapi.Client(
-                url=credentials['url_ads'], key=credentials['key_ads'], verify=True,
-                wait_until_complete=False, delete=False)
-
-        model_level = [str(x) for x in range(1,61)]
-        analysis_times = ['{0:02d}:00'.format(i) for i in range(0, 22, 3)]
-        steps = ['{}'.format(i) for i in range(0, 22, 3)]
-        area = [lat_n, lon_w, lat_s, lon_e]
-        date = settings['date'].strftime('%Y-%m-%d')
-
-        request = {
-            'format': 'netcdf',
-            'variable': variables,
-            'date': date,
-            'area': area,
-            #'grid': '0.25/0.25'   # NOTE to self: not supported in the ADS!
-        }
-
-        if settings['ftype'] == 'eac4_ml' or settings['ftype'] == 'eac4_sfc':
-            request.update({'time': analysis_times})
-        elif settings['ftype'] == 'egg4_ml':
-            request.update({'step': steps})
-
-        if settings['ftype'] == 'eac4_ml' or settings['ftype'] == 'egg4_ml':
-            request.update({'model_level': model_level})
-
-        if settings['ftype'] == 'eac4_ml' or settings['ftype'] == 'eac4_sfc':
-            cds_request = server.retrieve('cams-global-reanalysis-eac4', request)
-        elif settings['ftype'] == 'egg4_ml':
-            cds_request = server.retrieve('cams-global-ghg-reanalysis-egg4', request)
-
-        # Save pickle for later processing/download
-        with open(pickle_file, 'wb') as f:
-            pickle.dump(cds_request, f)
+            model_level = [str(x) for x in range(1,61)]
+            analysis_times = ['{0:02d}:00'.format(i) for i in range(0, 22, 3)]
+            steps = ['{}'.format(i) for i in range(0, 22, 3)]
+            area = [lat_n, lon_w, lat_s, lon_e]
+            date = settings['date'].strftime('%Y-%m-%d')
 
-    if settings['write_log']:
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
+            request = {
+                'format': 'netcdf',
+                'variable': variables,
+                'date': date,
+                'area': area,
+                #'grid': '0.25/0.25'   # NOTE to self: not supported in the ADS!
+            }
+
+            if settings['ftype'] == 'eac4_ml' or settings['ftype'] == 'eac4_sfc':
+                request.update({'time': analysis_times})
+            elif settings['ftype'] == 'egg4_ml':
+                request.update({'step': steps})
 
-    return finished
+            if settings['ftype'] == 'eac4_ml' or settings['ftype'] == 'egg4_ml':
+                request.update({'model_level': model_level})
+
+            if settings['ftype'] == 'eac4_ml' or settings['ftype'] == 'eac4_sfc':
+                cds_request = server.retrieve('cams-global-reanalysis-eac4', request)
+            elif settings['ftype'] == 'egg4_ml':
+                cds_request = server.retrieve('cams-global-ghg-reanalysis-egg4', request)
+
+            # Save pickle for later processing/download
+            with open(pickle_file, 'wb') as f:
+                pickle.dump(cds_request, f)
+
+    finally:
+        # Always detach the log file, also if the download fails or `error()` exits.
+        if settings['write_log']:
+            logger.removeHandler(log_handler)
+            log_handler.close()
+
+    return nc_file if finished else None
+
+
+def _process_cams_file(nc_file, settings, grid):
+    """
+    Patch (and optionally re-grid) downloaded CAMS file.
+    Returns True if the file is processed, and False if `nc_file` is None (download not finished).
+    """
+
+    if nc_file is None:
+        return False
+
+    patch_netcdf(nc_file)
+
+    if grid is not None:
+        message(f'Re-gridding NetCDF to {grid:.2f}°×{grid:.2f}° degree grid.')
+        regrid(nc_file, settings['central_lon'], settings['central_lat'], grid)
+
+    return True
 
 
 def download_cams(settings, variables, grid=None):
@@ -241,11 +259,13 @@ def download_cams(settings, variables, grid=None):
 
     header('Downloading CAMS for period: {} to {}'.format(settings['start_date'], settings['end_date']))
 
-    # Check if output directory exists, and ends with '/'
+    # Normalize output directory (without modifying the user's `settings`), and create it if needed.
+    settings = settings.copy()
+    settings['cams_path'] = era_tools.normalize_path(settings['cams_path'])
+
     if not os.path.isdir(settings['cams_path']):
-        error('Output directory \"{}\" does not exist!'.format(settings['cams_path']))
-    if settings['cams_path'][-1] != '/':
-        settings['cams_path'] += '/'
+        message('Creating output directory {}'.format(settings['cams_path']))
+        os.makedirs(settings['cams_path'], exist_ok=True)
 
     if cdsapi is None:
         error('CDS API is not installed. See: https://cds.climate.copernicus.eu/api-how-to')
@@ -281,10 +301,14 @@ def download_cams(settings, variables, grid=None):
                 settings_tmp.update({'date': date, 'ftype': ftype})
                 download_queue.append(settings_tmp)
 
-    finished = True
-    for req in download_queue:
-        if not _download_cams_file(req, variables, grid):
-            finished = False
+    # Submit/download the requests concurrently, see `download_era5()`.
+    tasks = [dask.delayed(_download_cams_file)(req, variables) for req in download_queue]
+    results = dask.compute(*tasks, scheduler='threads', num_workers=settings.get('ntasks', 4))
+
+    # Patch/re-grid the downloaded files. NetCDF/HDF5 is not thread-safe,
+    # so this is done serially, after all downloads are finished.
+    results = [_process_cams_file(nc_file, req, grid) for nc_file, req in zip(results, download_queue)]
+    finished = all(results)
 
     if not finished:
         print(' --------------------------------------------------------------')
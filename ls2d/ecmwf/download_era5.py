@@ -20,13 +20,19 @@
 
 # Python modules
 import subprocess as sp
+import threading
 import datetime
+import logging
+import shutil
+import json
+import time
 import sys,os
 import dill as pickle
 import requests
 
 # Third party modules
-import numpy as np
+import xarray as xr
+import dask
 
 # LS2D modules
 import ls2d.ecmwf.era_tools as era_tools
@@ -41,6 +47,155 @@ except ImportError:
     cdsapi = None
 
 
+# Levels, times and parameters of the CDS and MARS requests.
+_PRESSURE_LEVELS = (
+        '1', '2', '3', '5', '7', '10', '20', '30', '50', '70', '100', '125', '150', '175', '200',
+        '225', '250', '300', '350', '400', '450', '500', '550', '600', '650', '700', '750',
+        '775', '800', '825', '850', '875', '900', '925', '950', '975', '1000')
+
+_CDS_TIMES = tuple('{0:02d}:00'.format(i) for i in range(24))
+_CDS_MODEL_LEVELS = '/'.join(str(i) for i in range(1, 138))
+_CDS_MODEL_TIMES = '/'.join('{0:02d}:00:00'.format(i) for i in range(24))
+_CDS_MODEL_PARAMS = '75/76/130/131/132/133/135/203/246/247'
+
+_CDS_SURFACE_VARIABLES = (
+        'instantaneous_moisture_flux', 'high_vegetation_cover', 'leaf_area_index_high_vegetation',
+        'leaf_area_index_low_vegetation', 'low_vegetation_cover', 'sea_surface_temperature',
+        'skin_temperature', 'soil_temperature_level_1', 'soil_temperature_level_2',
+        'soil_temperature_level_3', 'soil_temperature_level_4', 'soil_type',
+        'surface_pressure', 'instantaneous_surface_sensible_heat_flux', 'type_of_high_vegetation',
+        'type_of_low_vegetation', 'volumetric_soil_water_layer_1', 'volumetric_soil_water_layer_2',
+        'volumetric_soil_water_layer_3', 'volumetric_soil_water_layer_4',
+        'forecast_logarithm_of_surface_roughness_for_heat', 'forecast_surface_roughness')
+
+_MARS_TIMES = '0/to/23/by/1'
+_MARS_MODEL_LEVELS = '1/to/137/by/1'
+_MARS_PRESSURE_LEVELS = '/'.join(_PRESSURE_LEVELS)
+
+# NOTE: the single level fields geopotential (129) and log surface pressure (152) are not
+# requested on model levels; `surface_an` already provides geopotential and surface pressure.
+_MARS_MODEL_PARAMS = '75/76/130/131/132/133/135/246/247/248/203'
+_MARS_PRESSURE_PARAMS = '129.128'
+_MARS_SURFACE_PARAMS = (
+        '15.128/16.128/17.128/18.128/27.128/28.128/29.128/30.128/34.128/35.128/36.128/37.128/'
+        '38.128/39.128/40.128/41.128/42.128/43.128/66.128/67.128/74.128/78.128/79.128/89.228/'
+        '90.228/129.128/134.128/136.128/137.128/139.128/151.128/160.128/161.128/162.128/163.128/'
+        '164.128/165.128/166.128/167.128/168.128/170.128/172.128/183.128/186.128/187.128/188.128/'
+        '198.128/229.128/230.128/231.128/232.128/235.128/236.128/243.128/244.128/245.128')
+
+# Dataset name and request for each file type. The dates and area are added per request.
+_CDS_REQUESTS = {
+    # Model level analysis, stored in tape archive, so downloads are VERY slow :-(
+    'model_an': ('reanalysis-era5-complete', {
+        'class': 'ea',
+        'expver': '1',
+        'levelist': _CDS_MODEL_LEVELS,
+        'levtype': 'ml',
+        'param': _CDS_MODEL_PARAMS,
+        'stream': 'oper',
+        'time': _CDS_MODEL_TIMES,
+        'type': 'an',
+        'grid': '0.25/0.25'}),
+    # Surface and pressure level analysis, stored on HDs, so downloads are fast :-)
+    'pressure_an': ('reanalysis-era5-pressure-levels', {
+        'product_type': 'reanalysis',
+        'time': list(_CDS_TIMES),
+        'pressure_level': list(_PRESSURE_LEVELS),
+        'variable': 'geopotential'}),
+    'surface_an': ('reanalysis-era5-single-levels', {
+        'product_type': 'reanalysis',
+        'time': list(_CDS_TIMES),
+        'variable': list(_CDS_SURFACE_VARIABLES)}),
+}
+
+# Maximum number of fields (levels x times x parameters x days) per CDS request. Larger requests
+# are rejected by CDS, but only after they have been queued. Limits are on the safe side.
+_CDS_MAX_FIELDS = {
+    'reanalysis-era5-complete': 600000,
+    'reanalysis-era5-pressure-levels': 120000,
+    'reanalysis-era5-single-levels': 120000,
+}
+
+_MARS_REQUESTS = {
+    'model_an': {
+        'levtype'  : 'ml',
+        'type'     : 'an',
+        'levelist' : _MARS_MODEL_LEVELS,
+        'time'     : _MARS_TIMES,
+        'param'    : _MARS_MODEL_PARAMS},
+    'pressure_an': {
+        'levtype'  : 'pl',
+        'type'     : 'an',
+        'levelist' : _MARS_PRESSURE_LEVELS,
+        'time'     : _MARS_TIMES,
+        'param'    : _MARS_PRESSURE_PARAMS},
+    'surface_an': {
+        'levtype'  : 'sfc',
+        'type'     : 'an',
+        'time'     : _MARS_TIMES,
+        'param'    : _MARS_SURFACE_PARAMS},
+}
+
+
+# CDS API clients, created once and shared by all downloads.
+_cds_clients = {}
+_cds_lock = threading.Lock()
+
+
+def _get_cds_client(write_log):
+    """
+    Return CDS API client. The client (which reads the `.cdsapirc` credentials and sets
+    up the HTTP session) is only created once, and re-used for all requests.
+    With `write_log`, the client output is send to the `ls2d.cds` logger.
+    """
+
+    with _cds_lock:
+        if write_log not in _cds_clients:
+            if write_log:
+                logger = logging.getLogger('ls2d.cds')
+                log_callbacks = {
+                        'info_callback': logger.info,
+                        'warning_callback': logger.warning,
+                        'error_callback': logger.error}
+            else:
+                log_callbacks = {}
+
+            _cds_clients[write_log] = cdsapi.Client(
+                    wait_until_complete=False, delete=False, **log_callbacks)
+
+        return _cds_clients[write_log]
+
+
+def _count_fields(ftype, n_days):
+    """
+    Estimate the number of fields in a CDS request of `n_days` for file type `ftype`
+    """
+
+    dataset, request = _CDS_REQUESTS[ftype]
+
+    n_fields = n_days
+    for key in ['levelist', 'pressure_level', 'time', 'param', 'variable']:
+        if key in request:
+            value = request[key]
+            n_fields *= len(value.split('/')) if isinstance(value, str) else len(value)
+
+    return n_fields
+
+
+def _split_dates(dates, ftype):
+    """
+    Recursively split list of `dates` in halves, until the CDS requests are below `_CDS_MAX_FIELDS`
+    """
+
+    dataset, request = _CDS_REQUESTS[ftype]
+
+    if len(dates) > 1 and _count_fields(ftype, len(dates)) > _CDS_MAX_FIELDS[dataset]:
+        half = len(dates) // 2
+        return _split_dates(dates[:half], ftype) + _split_dates(dates[half:], ftype)
+    else:
+        return [dates]
+
+
 def _retrieve_from_MARS(request, settings, nc_dir, nc_file, qos):
     """
     Retrieve file from MARS
@@ -66,7 +221,7 @@ def _retrieve_from_MARS(request, settings, nc_dir, nc_file, qos):
     f.close()
 
     # Create SLURM job file
-    date  = settings['date']
+    date  = settings['dates'][0]
     ftype = settings['ftype'].split('_')
     jobname = '{0:04d}{1:02d}{2:02d}{3:}{4:}'.format(date.year, date.month, date.day, ftype[1], ftype[0])
 
@@ -88,6 +243,277 @@ def _retrieve_from_MARS(request, settings, nc_dir, nc_file, qos):
     execute('sbatch {}'.format(slurm_job))
 
 
+def _stream_download(url, target, session=requests, max_retries=5, chunk_size=2**20):
+    """
+    Download `url` to `target` in chunks of `chunk_size` bytes. Interrupted downloads
+    are resumed using HTTP Range requests, with an increasing wait time between retries.
+    Only partial downloads from this call are resumed; an existing `target` file
+    (e.g. left behind by an earlier request) is removed first.
+    """
+
+    if os.path.isfile(target):
+        os.remove(target)
+
+    for attempt in range(max_retries+1):
+        size = os.path.getsize(target) if os.path.isfile(target) else 0
+        headers = {'Range': 'bytes={}-'.format(size)} if size > 0 else {}
+
+        try:
+            with session.get(url, stream=True, headers=headers, timeout=60) as r:
+
+                # Range not satisfiable; restart the download from scratch.
+                if r.status_code == 416:
+                    if attempt == max_retries:
+                        error('Download of \"{}\" failed: range not satisfiable'.format(url))
+                    warning('Resuming download failed, restarting download of \"{}\"'.format(url))
+                    os.remove(target)
+                    continue
+
+                r.raise_for_status()
+
+                # Only append if the server supports resuming, otherwise start from scratch.
+                mode = 'ab' if r.status_code == 206 else 'wb'
+                with open(target, mode) as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+            return
+
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            if attempt == max_retries:
+                error('Download of \"{}\" failed: {}'.format(url, e))
+
+            wait = 10 * 2**attempt
+            warning('Download interrupted, retrying in {} s ({})'.format(wait, e))
+            time.sleep(wait)
+
+
+def _is_grib(file_name):
+    """
+    Check if `file_name` is a GRIB file
+    """
+    with open(file_name, 'rb') as f:
+        return f.read(4) == b'GRIB'
+
+
+def _grib_to_netcdf(grib_file, nc_file):
+    """
+    Convert GRIB to NetCDF with ecCodes. This results in the same
+    NetCDF format as the old CDS, and the files retrieved from MARS.
+    """
+    if sp.call(['grib_to_netcdf', '-o', nc_file, grib_file]) != 0:
+        error('Conversion of \"{}\" to NetCDF failed!'.format(grib_file))
+    os.remove(grib_file)
+
+
+def _get_area(settings):
+    """
+    Return bounds `[north, west, south, east]` of the download domain
+    """
+    return [settings['central_lat']+settings['area_size'],
+            settings['central_lon']-settings['area_size'],
+            settings['central_lat']-settings['area_size'],
+            settings['central_lon']+settings['area_size']]
+
+
+def _get_meta(settings, date):
+    """
+    Return description of the CDS request for the daily file of `date`,
+    which is stored next to the NetCDF file as `type.nc.meta.json`
+    """
+    dataset, request = _CDS_REQUESTS[settings['ftype']]
+
+    # Round trip through JSON, to compare with the (JSON) sidecar files.
+    return json.loads(json.dumps({
+        'dataset': dataset,
+        'ftype': settings['ftype'],
+        'date': '{0:%Y-%m-%d}'.format(date),
+        'area': _get_area(settings),
+        'request': request}))
+
+
+def _write_meta(nc_file, meta):
+    """
+    Write request description `meta` of `nc_file` to JSON sidecar file
+    """
+    with open('{}.meta.json'.format(nc_file), 'w') as f:
+        json.dump(meta, f)
+
+
+def _is_superset(meta, meta_needed):
+    """
+    Check if the file described by `meta` contains all data described by `meta_needed`:
+    identical request and date, and a larger or equal domain.
+    """
+    for key in ['dataset', 'ftype', 'date', 'request']:
+        if meta.get(key) != meta_needed[key]:
+            return False
+
+    north, west, south, east = meta['area']
+    north_n, west_n, south_n, east_n = meta_needed['area']
+
+    return north >= north_n and west <= west_n and south <= south_n and east >= east_n
+
+
+def _index_meta_files(local_files):
+    """
+    Index the JSON sidecar files (`path/case/yyyy/mm/dd/type.nc.meta.json`)
+    in `local_files` by `(yyyy, mm, dd, type)`
+    """
+
+    index = {}
+    for f in local_files:
+        if f.endswith('.nc.meta.json'):
+            parts = f.split(os.sep)
+            if len(parts) >= 4:
+                key = tuple(parts[-4:-1]) + (parts[-1][:-len('.nc.meta.json')],)
+                index.setdefault(key, []).append(f)
+
+    return index
+
+
+def _find_local_superset(settings, date, meta_index, local_files):
+    """
+    Search the other cases in `era5_path` for a daily file which contains the data required
+    for `date`, using the sidecar files indexed by `_index_meta_files()` and the `local_files`
+    listed by `era_tools.list_local_files()`. Returns the path of that file and the required
+    metadata, or None if no match.
+    """
+
+    meta_needed = _get_meta(settings, date)
+
+    key = ('{0:04d}'.format(date.year), '{0:02d}'.format(date.month),
+           '{0:02d}'.format(date.day), settings['ftype'])
+
+    for meta_file in sorted(meta_index.get(key, [])):
+        nc_file = meta_file[:-len('.meta.json')]
+        if nc_file not in local_files:
+            continue
+
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if _is_superset(meta, meta_needed):
+            return nc_file, meta_needed
+
+    return None
+
+
+def _set_compression(ds):
+    """
+    Compress NetCDF output (lossless), while keeping the original packing (if any) of the variables.
+    """
+    for var in ds.data_vars.values():
+        for key in ['contiguous', 'chunksizes']:
+            var.encoding.pop(key, None)
+        var.encoding.update({'zlib': True, 'complevel': 4, 'shuffle': True})
+
+
+def _slice_local(source_file, nc_file, meta):
+    """
+    Create `nc_file` by slicing the domain described by `meta` from the (larger) `source_file`.
+    Returns False (without writing `nc_file`) if the domain can not be sliced from `source_file`.
+    """
+
+    north, west, south, east = meta['area']
+
+    ds = xr.open_dataset(source_file)
+    lat = ds.latitude.values
+    lon = ds.longitude.values
+
+    # Convert requested longitudes (-180..180) to the convention of the source file (0..360).
+    if lon.max() > 180:
+        west %= 360
+        east %= 360
+        if west > east:
+            # Domain crosses the 0/360 meridian of the source file.
+            ds.close()
+            return False
+
+    # ERA5 latitudes are normally descending, but don't rely on it.
+    lat_slice = slice(north, south) if lat[0] > lat[-1] else slice(south, north)
+    ds_out = ds.sel(latitude=lat_slice, longitude=slice(west, east))
+
+    # Check if the sliced domain covers the requested domain.
+    lat_out = ds_out.latitude.values
+    lon_out = ds_out.longitude.values
+    dlat = abs(lat[1] - lat[0]) if lat.size > 1 else 0
+    dlon = abs(lon[1] - lon[0]) if lon.size > 1 else 0
+
+    if lat_out.size == 0 or lon_out.size == 0 or \
+            lat_out.min() - south >= dlat or north - lat_out.max() >= dlat or \
+            lon_out.min() - west  >= dlon or east  - lon_out.max() >= dlon:
+        ds.close()
+        return False
+
+    message('Slicing {} from {}'.format(nc_file, source_file))
+
+    # Write to a temporary file first, so that a failure never leaves a (partial) daily file.
+    tmp_file = '{}.tmp'.format(nc_file)
+    try:
+        _set_compression(ds_out)
+        ds_out.to_netcdf(tmp_file, format='NETCDF4_CLASSIC')
+        os.replace(tmp_file, nc_file)
+    except (OSError, RuntimeError, ValueError) as e:
+        warning('Slicing {} from {} failed: {}'.format(nc_file, source_file, e))
+        return False
+    finally:
+        ds.close()
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+    _write_meta(nc_file, meta)
+
+    return True
+
+
+def _split_chunk(nc_file, settings):
+    """
+    Split multi-day NetCDF file into the daily `path/yyyy/mm/dd/type.nc` files expected by `Read_era5`.
+    Returns True if the daily files are written, and False if `nc_file` is None (download not finished).
+    """
+
+    if nc_file is None:
+        return False
+
+    ds = xr.open_dataset(nc_file)
+    _set_compression(ds)
+
+    # Write all days to temporary files first, so that a failure never leaves (partial) daily files,
+    # and a new run can simply split the (complete) `nc_file` again.
+    day_files = []
+    for date in settings['dates']:
+        day_file = era_tools.era5_file_path(
+                date.year, date.month, date.day, settings['era5_path'],
+                settings['case_name'], settings['ftype'], False)
+
+        message('Writing {}'.format(day_file))
+        ds_day = ds.sel(time=slice(date, date + datetime.timedelta(hours=23)))
+        ds_day.to_netcdf('{}.tmp'.format(day_file), format='NETCDF4_CLASSIC')
+        day_files.append((date, day_file))
+
+    for date, day_file in day_files:
+        os.replace('{}.tmp'.format(day_file), day_file)
+
+        # Store request next to the daily file, to allow re-using it for other cases.
+        _write_meta(day_file, _get_meta(settings, date))
+
+    ds.close()
+    os.remove(nc_file)
+
+    # Only remove the CDS request once the daily files are written,
+    # so that a failure in the conversion or splitting never requires a new request.
+    pickle_file = '{}.pickle'.format(nc_file[:-3])
+    if os.path.isfile(pickle_file):
+        os.remove(pickle_file)
+
+    return True
+
+
 def _download_era5_file(settings):
     """
     Download ERA5 analysis or forecasts on surface, model or pressure levels
@@ -96,220 +522,192 @@ def _download_era5_file(settings):
     Arguments:
         settings : dictionary
             Dictionary with keys:
-                date : datetime object with date to download
+                dates : list of datetime objects with dates to download. For CDS,
+                        these are consecutive days within a single month, which are
+                        retrieved as a single request and split into daily files
+                        afterwards. For MARS, the list contains a single date.
                 lat, lon : requested latitude and longitude
                 size : download an area of lat+/-size, lon+/-size (degrees)
                 path : absolute or relative path to save the NetCDF data
                 case : case name used in file name of NetCDF files
                 ftype : level/forecast/analysis switch (in: [model_an, model_fc, pressure_an, surface_an])
+
+    Returns:
+        Path of the downloaded (GRIB or NetCDF) file, or None if the download is not (yet) finished.
+        The conversion to NetCDF is done afterwards by `_convert_download()`, outside the download threads.
     """
 
-    header('Downloading: {} - {}'.format(settings['date'], settings['ftype']))
+    dates = settings['dates']
+
+    if len(dates) == 1:
+        header('Downloading: {} - {}'.format(dates[0], settings['ftype']))
+    else:
+        header('Downloading: {} to {} - {}'.format(dates[0], dates[-1], settings['ftype']))
 
     # Keep track of CDS downloads which are finished:
     finished = False
 
-    # Output file name
-    nc_dir, nc_file = era_tools.era5_file_path(
-            settings['date'].year, settings['date'].month, settings['date'].day,
-            settings['era5_path'], settings['case_name'], settings['ftype'])
+    # Output file name. CDS requests span multiple days, and
+    # are saved in the monthly directory before splitting.
+    if settings['data_source'] == 'CDS':
+        nc_dir, nc_file = era_tools.era5_chunk_path(
+                dates, settings['era5_path'], settings['case_name'], settings['ftype'])
+    else:
+        nc_dir, nc_file = era_tools.era5_file_path(
+                dates[0].year, dates[0].month, dates[0].day,
+                settings['era5_path'], settings['case_name'], settings['ftype'])
 
-    # Write CDS API prints to log file (NetCDF file path/name appended with .out/.err)
+    # Write CDS API output to log file (NetCDF file path/name appended with .log)
     if settings['write_log']:
-        out_file   = '{}.out'.format(nc_file[:-3])
-        err_file   = '{}.err'.format(nc_file[:-3])
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = open(out_file, 'w')
-        sys.stderr = open(err_file, 'w')
-
-    # Bounds of domain
-    lat_n = settings['central_lat']+settings['area_size']
-    lat_s = settings['central_lat']-settings['area_size']
-    lon_w = settings['central_lon']-settings['area_size']
-    lon_e = settings['central_lon']+settings['area_size']
-
-    # Monitor the required download time
-    start = datetime.datetime.now()
-
-    # Switch between CDS and MARS downloads
-    if settings['data_source'] == 'CDS':
+        logger, log_handler = era_tools.get_file_logger('ls2d.cds', '{}.log'.format(nc_file[:-3]))
 
-        # Check if pickle with previous request is available.
-        # If so, try to download NetCDF file, if not, submit new request
-        pickle_file = '{}.pickle'.format(nc_file[:-3])
+    try:
+        # Bounds of domain
+        lat_n, lon_w, lat_s, lon_e = _get_area(settings)
 
-        if os.path.isfile(pickle_file):
-            message('Found previous CDS request!')
+        # Monitor the required download time
+        start = datetime.datetime.now()
 
-            with open(pickle_file, 'rb') as f:
-                cds_request = pickle.load(f)
+        # Switch between CDS and MARS downloads
+        if settings['data_source'] == 'CDS':
 
-                try:
-                    cds_request.update()
-                except requests.exceptions.HTTPError:
-                    error('CDS request is no longer available online!', exit=False)
-                    error('To continue, delete the previous request: {}'.format(pickle_file))
+            # Check if pickle with previous request is available.
+            # If so, try to download NetCDF file, if not, submit new request
+            pickle_file = '{}.pickle'.format(nc_file[:-3])
 
-                state = cds_request.reply['state']
+            if os.path.isfile(nc_file):
+                # Downloaded and converted in a previous run, but not (yet) split into daily files.
+                message('Found previous CDS download {}'.format(nc_file))
+                download_file = nc_file
+                finished = True
 
-                if state == 'completed':
-                    message('Request finished, downloading NetCDF file')
+            elif os.path.isfile(pickle_file):
+                message('Found previous CDS request!')
 
-                    cds_request.download(nc_file)
-                    f.close()
-                    os.remove(pickle_file)
+                with open(pickle_file, 'rb') as f:
+                    cds_request = pickle.load(f)
 
-                    # Patch NetCDF file, to make the (+/-) identical to the old CDS
-                    # files, and files retrieved from MARS.
-                    patch_netcdf(nc_file)
+                    try:
+                        cds_request.update()
+                    except requests.exceptions.HTTPError:
+                        error('CDS request is no longer available online!', exit=False)
+                        error('To continue, delete the previous request: {}'.format(pickle_file))
 
-                    finished = True
+                    state = cds_request.reply['state']
 
-                elif state in ('queued', 'accepted', 'running'):
-                    message('Request not finished, current status = \"{}\"'.format(state))
+                    if state == 'completed':
+                        message('Request finished, downloading file')
 
-                else:
-                    error('Request failed, status = \"{}\"'.format(state), exit=False)
-                    message('Error message = {}'.format(cds_request.reply['error'].get('message')))
-                    message('Error reason = {}'.format(cds_request.reply['error'].get('reason')))
+                        download_file = '{}.download'.format(nc_file[:-3])
 
-        else:
-            message('No previous CDS request, submitting new one')
+                        # Stream download directly to disk, using the (authenticated) session of the request.
+                        url = getattr(cds_request, 'location', None)
+                        if url is not None:
+                            _stream_download(url, download_file, getattr(cds_request, 'session', requests))
+                        else:
+                            cds_request.download(download_file)
 
-            # Create instance of CDS API
-            server = cdsapi.Client(wait_until_complete=False, delete=False)
+                        finished = True
 
-            # Surface and pressure level analysis, stored on HDs, so downloads are fast :-)
-            if settings['ftype'] == 'pressure_an' or settings['ftype'] == 'surface_an':
+                    elif state in ('queued', 'accepted', 'running'):
+                        message('Request not finished, current status = \"{}\"'.format(state))
 
-                analysis_times = ['{0:02d}:00'.format(i) for i in range(24)]
-                area = [lat_n, lon_w, lat_s, lon_e]
+                    else:
+                        error('Request failed, status = \"{}\"'.format(state), exit=False)
+                        message('Error message = {}'.format(cds_request.reply['error'].get('message')))
+                        message('Error reason = {}'.format(cds_request.reply['error'].get('reason')))
 
-                request = {
-                    'product_type': 'reanalysis',
-                    'format': 'netcdf',
-                    'year': '{0:04d}'.format(settings['date'].year),
-                    'month': '{0:02d}'.format(settings['date'].month),
-                    'day': '{0:02d}'.format(settings['date'].day),
-                    'time': analysis_times,
-                    'area': area,
-                }
+            else:
+                message('No previous CDS request, submitting new one')
 
-                if settings['ftype'] == 'pressure_an':
-                    pressure_levels = [
-                        '1', '2', '3', '5', '7', '10', '20', '30', '50', '70', '100', '125', '150', '175', '200',
-                        '225', '250', '300', '350', '400', '450', '500', '550', '600', '650', '700', '750',
-                        '775', '800', '825', '850', '875', '900', '925', '950', '975', '1000']
+                server = _get_cds_client(settings['write_log'])
 
-                    request.update({
-                        'pressure_level': pressure_levels,
-                        'variable': 'geopotential'})
+                # Request GRIB if it can be converted locally. The CDS applies much stricter
+                # size limits to NetCDF requests, which fail for large (monthly) requests.
+                if shutil.which('grib_to_netcdf') is not None:
+                    data_format = 'grib'
+                else:
+                    warning('ecCodes `grib_to_netcdf` not found, requesting NetCDF from CDS.')
+                    data_format = 'netcdf'
 
-                    cds_request = server.retrieve('reanalysis-era5-pressure-levels', request)
+                dataset, request = _CDS_REQUESTS[settings['ftype']]
+                request = dict(request, format=data_format)
 
-                elif settings['ftype'] == 'surface_an':
+                if settings['ftype'] == 'model_an':
                     request.update({
-                        'variable': [
-                            'instantaneous_moisture_flux', 'high_vegetation_cover', 'leaf_area_index_high_vegetation',
-                            'leaf_area_index_low_vegetation', 'low_vegetation_cover', 'sea_surface_temperature',
-                            'skin_temperature', 'soil_temperature_level_1', 'soil_temperature_level_2',
-                            'soil_temperature_level_3', 'soil_temperature_level_4', 'soil_type',
-                            'surface_pressure', 'instantaneous_surface_sensible_heat_flux', 'type_of_high_vegetation',
-                            'type_of_low_vegetation', 'volumetric_soil_water_layer_1', 'volumetric_soil_water_layer_2',
-                            'volumetric_soil_water_layer_3', 'volumetric_soil_water_layer_4',
-                            'forecast_logarithm_of_surface_roughness_for_heat', 'forecast_surface_roughness']})
-
-                    cds_request = server.retrieve('reanalysis-era5-single-levels', request)
-
-            # Model level analysis, stored in tape archive, so downloads are VERY slow :-(
-            elif settings['ftype'] == 'model_an':
-
-                model_levels = '/'.join(list(np.arange(1,138).astype(str)))
-                analysis_times = '/'.join(['{0:02d}:00:00'.format(i) for i in range(24)])
-
-                request = {
-                    'class': 'ea',
-                    'date': '{0:04d}-{1:02d}-{2:02d}'.format(
-                        settings['date'].year, settings['date'].month, settings['date'].day),
-                    'expver': '1',
-                    'levelist': model_levels,
-                    'levtype': 'ml',
-                    'param': '75/76/130/131/132/133/135/203/246/247',
-                    'stream': 'oper',
-                    'time': analysis_times,
-                    'type': 'an',
-                    'area': '{}/{}/{}/{}'.format(lat_n, lon_w, lat_s, lon_e),
-                    'grid': '0.25/0.25',
-                    'format': 'netcdf'}
-
-                cds_request = server.retrieve('reanalysis-era5-complete', request)
-
-            # Save pickle for later processing/download
-            with open(pickle_file, 'wb') as f:
-                pickle.dump(cds_request, f)
-
-
-    elif settings['data_source'] == 'MARS':
-
-        # Shared set of CDS Python API settings for all download types:
-        request = {
-            'class'   : 'ea',
-            'expver'  : '{}'.format(settings['era5_expver']),
-            'stream'  : 'oper',
-            'date'    : '{0:04d}-{1:02d}-{2:02d}'.format(
-                settings['date'].year, settings['date'].month, settings['date'].day),
-            'area'    : '{}/{}/{}/{}'.format(lat_n, lon_w, lat_s, lon_e),
-            'grid'    : '0.25/0.25',
-            'format'  : 'netcdf',
-        }
-
-        # Model levels and time steps to retrieve
-        model_levels = '1/to/137/by/1'
-        press_levels = '1/2/3/5/7/10/20/30/50/70/100/125/150/175/200/225/250/300/350/400/450/\
-    500/550/600/650/700/750/775/800/825/850/875/900/925/950/975/1000'
-
-        an_times = '0/to/23/by/1'
-
-        # Update request based on level/analysis/forecast:
-        if settings['ftype'] == 'model_an':
-            qos = 'nf'
-            request.update({
-                'levtype'  : 'ml',
-                'type'     : 'an',
-                'levelist' : model_levels,
-                'time'     : an_times,
-                'param'    : '75/76/129/130/131/132/133/135/152/246/247/248/203'
-            })
-
-        elif settings['ftype'] == 'pressure_an':
-            qos = 'nf'
-            request.update({
-                'levtype'  : 'pl',
-                'type'     : 'an',
-                'levelist' : press_levels,
-                'time'     : an_times,
-                'param'    : '129.128'
-            })
-
-        elif settings['ftype'] == 'surface_an':
+                        'date': '{0:%Y-%m-%d}/to/{1:%Y-%m-%d}'.format(dates[0], dates[-1]),
+                        'area': '{}/{}/{}/{}'.format(lat_n, lon_w, lat_s, lon_e)})
+                else:
+                    request.update({
+                        'year': '{0:04d}'.format(dates[0].year),
+                        'month': '{0:02d}'.format(dates[0].month),
+                        'day': ['{0:02d}'.format(date.day) for date in dates],
+                        'area': [lat_n, lon_w, lat_s, lon_e]})
+
+                cds_request = server.retrieve(dataset, request)
+
+                # Save pickle for later processing/download
+                with open(pickle_file, 'wb') as f:
+                    pickle.dump(cds_request, f)
+
+
+        elif settings['data_source'] == 'MARS':
+
+            # Shared set of CDS Python API settings for all download types:
+            request = {
+                'class'   : 'ea',
+                'expver'  : '{}'.format(settings['era5_expver']),
+                'stream'  : 'oper',
+                'date'    : '{0:%Y-%m-%d}'.format(dates[0]),
+                'area'    : '{}/{}/{}/{}'.format(lat_n, lon_w, lat_s, lon_e),
+                'grid'    : '0.25/0.25',
+                'format'  : 'netcdf',
+            }
+
+            # Update request based on level/analysis/forecast:
+            request.update(_MARS_REQUESTS[settings['ftype']])
             qos = 'nf'
-            request.update({
-                'levtype'  : 'sfc',
-                'type'     : 'an',
-                'time'     : an_times,
-                'param'    : '15.128/16.128/17.128/18.128/27.128/28.128/29.128/30.128/34.128/35.128/36.128/37.128/38.128/39.128/40.128/41.128/42.128/43.128/66.128/67.128/74.128/78.128/79.128/89.228/90.228/129.128/134.128/136.128/137.128/139.128/151.128/160.128/161.128/162.128/163.128/164.128/165.128/166.128/167.128/168.128/170.128/172.128/183.128/186.128/187.128/188.128/198.128/229.128/230.128/231.128/232.128/235.128/236.128/243.128/244.128/245.128'
-            })
 
-        # Submit download to SLURM:
-        _retrieve_from_MARS(request, settings, nc_dir, nc_file, qos)
+            # Submit download to SLURM:
+            _retrieve_from_MARS(request, settings, nc_dir, nc_file, qos)
 
-    # Restore printing to screen
-    if settings['write_log']:
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
+    finally:
+        # Always detach the log file, also if the download fails or `error()` exits.
+        if settings['write_log']:
+            logger.removeHandler(log_handler)
+            log_handler.close()
 
-    return finished
+    return download_file if finished else None
+
+
+def _convert_download(download_file, settings):
+    """
+    Convert downloaded CDS file to NetCDF, in the format of the old CDS and files retrieved from MARS.
+    Returns the path of the NetCDF file, or None if `download_file` is None (download not finished).
+    """
+
+    if download_file is None:
+        return None
+
+    nc_dir, nc_file = era_tools.era5_chunk_path(
+            settings['dates'], settings['era5_path'], settings['case_name'], settings['ftype'])
+
+    # Already converted in a previous run.
+    if download_file == nc_file:
+        return nc_file
+
+    # Convert/patch before moving the file into place, so that `nc_file` only exists once it is complete.
+    if _is_grib(download_file):
+        _grib_to_netcdf(download_file, '{}.tmp'.format(nc_file))
+        os.replace('{}.tmp'.format(nc_file), nc_file)
+    else:
+        # Patch NetCDF file, to make the (+/-) identical to the old CDS
+        # files, and files retrieved from MARS.
+        patch_netcdf(download_file, settings['ftype'])
+        os.replace(download_file, nc_file)
+        os.remove('{}.unpatched'.format(download_file))
+
+    return nc_file
 
 
 def download_era5(settings, exit_when_waiting=True):
@@ -338,11 +736,13 @@ def download_era5(settings, exit_when_waiting=True):
 
     header('Downloading ERA5 for period: {} to {}'.format(settings['start_date'], settings['end_date']))
 
-    # Check if output directory exists, and ends with '/'
+    # Normalize output directory (without modifying the user's `settings`), and create it if needed.
+    settings = settings.copy()
+    settings['era5_path'] = era_tools.normalize_path(settings['era5_path'])
+
     if not os.path.isdir(settings['era5_path']):
-        error('Output directory \"{}\" does not exist!'.format(settings['era5_path']))
-    if settings['era5_path'][-1] != '/':
-        settings['era5_path'] += '/'
+        message('Creating output directory {}'.format(settings['era5_path']))
+        os.makedirs(settings['era5_path'], exist_ok=True)
 
     if cdsapi is None:
         error('CDS API is not installed. See: https://cds.climate.copernicus.eu/api-how-to')
@@ -355,8 +755,8 @@ def download_era5(settings, exit_when_waiting=True):
     an_dates = era_tools.get_required_analysis(start, end)
     fc_dates = era_tools.get_required_forecast(start, end)
 
-    # Base dictionary to pass to download function. In Python >3.3, multiprocessings Pool() can accept
-    # multiple arguments. For now, keep it generic for older versions by passing all arguments inside a dict.
+    # Base dictionary to pass to download function. All arguments are passed inside a single dict,
+    # which keeps the download function easy to map over the download queue.
     download_settings = settings.copy()
     download_queue = []
 
@@ -366,29 +766,71 @@ def download_era5(settings, exit_when_waiting=True):
     else:
         blacklist = []
 
+    # List all local files once, instead of checking each file individually. For CDS, list the
+    # files of all cases, which are searched for larger domains containing the required data.
+    if settings['data_source'] == 'CDS':
+        local_files = era_tools.list_local_files(settings['era5_path'])
+        meta_index = _index_meta_files(local_files)
+    else:
+        local_files = era_tools.list_local_files(settings['era5_path'], settings['case_name'])
+
     # Loop over all required files, check if there is a local version, if not add to download queue
     # Analysis files:
-    for date in an_dates:
-        for ftype in ['model_an', 'pressure_an', 'surface_an']:
-            if ftype not in blacklist:
+    for ftype in ['model_an', 'pressure_an', 'surface_an']:
+        if ftype not in blacklist:
+            missing_dates = []
+            for date in an_dates:
                 era_dir, era_file = era_tools.era5_file_path(
                         date.year, date.month, date.day, settings['era5_path'], settings['case_name'], ftype)
 
-                if not os.path.exists(era_dir):
+                if era_dir not in local_files:
                     message('Creating output directory {}'.format(era_dir))
-                    os.makedirs(era_dir)
+                    os.makedirs(era_dir, exist_ok=True)
+                    local_files.add(era_dir)
 
-                if os.path.isfile(era_file):
+                if era_file in local_files:
                     message('Found {} - {} local'.format(date, ftype))
-                else:
-                    settings_tmp = download_settings.copy()
-                    settings_tmp.update({'date': date, 'ftype':ftype})
-                    download_queue.append(settings_tmp)
-
-    finished = True
-    for req in download_queue:
-        if not _download_era5_file(req):
-            finished = False
+                    continue
+
+                # Check if the data is available as part of a larger domain from another case.
+                if settings['data_source'] == 'CDS':
+                    settings_tmp = dict(download_settings, ftype=ftype)
+                    match = _find_local_superset(settings_tmp, date, meta_index, local_files)
+                    if match is not None and _slice_local(match[0], era_file, match[1]):
+                        continue
+
+                missing_dates.append(date)
+
+            # CDS requests are bundled per month, which strongly reduces the
+            # number of requests (and queueing time...). MARS requests are submitted per day.
+            # Months which exceed the CDS size limits are split before submission.
+            if settings['data_source'] == 'CDS':
+                date_groups = []
+                for dates in era_tools.group_dates(missing_dates):
+                    date_groups += _split_dates(dates, ftype)
+            else:
+                date_groups = [[date] for date in missing_dates]
+
+            for dates in date_groups:
+                settings_tmp = download_settings.copy()
+                settings_tmp.update({'dates': dates, 'ftype': ftype})
+                download_queue.append(settings_tmp)
+
+    # Submit new requests and download finished ones concurrently. The CDS calls
+    # are network bound, so threads (instead of processes) are sufficient.
+    # CDS only runs a few (~5) requests per user at the same time, more workers don't help.
+    n_workers = settings.get('ntasks', 4)
+
+    tasks = [dask.delayed(_download_era5_file)(req) for req in download_queue]
+    results = dask.compute(*tasks, scheduler='threads', num_workers=n_workers)
+
+    # Convert and split the multi-day CDS downloads into daily files. NetCDF/HDF5 is
+    # not thread-safe, so this is done serially, after all downloads are finished.
+    if settings['data_source'] == 'CDS':
+        results = [_split_chunk(_convert_download(download_file, req), req)
+                   for download_file, req in zip(results, download_queue)]
+
+    finished = all(results)
 
     if not finished:
         if settings['data_source'] == 'CDS':
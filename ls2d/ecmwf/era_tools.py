@@ -20,6 +20,9 @@
 
 # Python modules
 import datetime
+import threading
+import logging
+import os
 
 # Third party modules
 
@@ -29,11 +32,11 @@ from ls2d.src.messages import *
 
 def era5_file_path(year, month, day, path, case, ftype, return_dir=True):
     """
-    Return saving path of files in format `path/yyyy/mm/dd/type.nc`
+    Return saving path of files in format `path/case/yyyy/mm/dd/type.nc`
     """
 
-    era_dir = "{0}/{1}/{2:04d}/{3:02d}/{4:02d}".format(path, case, year, month, day)
-    era_file = "{0}/{1}.nc".format(era_dir, ftype)
+    era_dir = os.path.join(path, case, '{0:04d}'.format(year), '{0:02d}'.format(month), '{0:02d}'.format(day))
+    era_file = os.path.join(era_dir, '{}.nc'.format(ftype))
 
     if return_dir:
         return era_dir, era_file
@@ -41,6 +44,70 @@ def era5_file_path(year, month, day, path, case, ftype, return_dir=True):
         return era_file
 
 
+def era5_chunk_path(dates, path, case, ftype):
+    """
+    Return saving path of multi-day downloads in format `path/case/yyyy/mm/type_dd-dd.nc`
+    """
+
+    era_dir = os.path.join(path, case, '{0:04d}'.format(dates[0].year), '{0:02d}'.format(dates[0].month))
+    era_file = os.path.join(era_dir, '{0}_{1:02d}-{2:02d}.nc'.format(ftype, dates[0].day, dates[-1].day))
+
+    return era_dir, era_file
+
+
+def get_file_logger(name, log_file):
+    """
+    Return logger (and its handler) which writes to `log_file`. The handler only accepts
+    records from the calling thread, so multiple downloads running concurrently in threads
+    can share a single logger, while each writing to their own log file.
+    """
+
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    thread = threading.get_ident()
+
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    handler.addFilter(lambda record: record.thread == thread)
+    logger.addHandler(handler)
+
+    return logger, handler
+
+
+def list_local_files(path, case=None):
+    """
+    Return set with all files and directories in `path/case` (or in `path` for all cases if `case`
+    is None), using a single directory traversal. Paths are formatted identical to `era5_file_path`,
+    so they can be checked with `in`.
+    """
+
+    local_files = set()
+    for root, dirs, files in os.walk(path if case is None else os.path.join(path, case)):
+        local_files.update(os.path.join(root, d) for d in dirs)
+        local_files.update(os.path.join(root, f) for f in files)
+
+    return local_files
+
+
+def group_dates(dates):
+    """
+    Group (sorted) list of datetime objects into lists of consecutive days within the same month
+    """
+
+    one_day = datetime.timedelta(days=1)
+
+    groups = []
+    for date in dates:
+        if len(groups) > 0 and groups[-1][-1] + one_day == date and groups[-1][-1].month == date.month:
+            groups[-1].append(date)
+        else:
+            groups.append([date])
+
+    return groups
+
+
 def get_required_analysis(start, end, freq=1):
 
     # One day datetime offset
@@ -83,6 +150,13 @@ def get_required_forecast(start, end):
     return dates
 
 
+def normalize_path(path):
+    """
+    Return absolute and normalized version of `path`
+    """
+    return os.path.abspath(os.path.expanduser(path))
+
+
 def lower_to_hour(time):
     time_out = datetime.datetime(time.year, time.month, time.day, time.hour)
     if time.minute != 0 or time.second != 0:
@@ -34,7 +34,7 @@ sys.path.append('/home/bart/meteo/models/LS2D')
 from ls2d.src.messages import *
 
 
-def patch_netcdf(nc_file_path):
+def patch_netcdf(nc_file_path, ftype=None):
     """
     With the introduction of the new Copernicus Data Store (CDS) in September 2024,
     the NetCDF format for ERA5 data has undergone some changes. As a result, these
@@ -43,6 +43,8 @@ def patch_netcdf(nc_file_path):
 
     NOTE: the patched files are not 100% identical to the old format, just
     identical enough for (LS)2D to read and parse them. 
+
+    The file type is derived from the file name, unless `ftype` (e.g. `model_an`) is provided.
     """
 
     # Backup old file, and remove original.
@@ -62,7 +64,10 @@ def patch_netcdf(nc_file_path):
     if 'expver' in ds.variables:
         ds = ds.drop('expver')
 
-    file_name = os.path.basename(nc_file_path)
+    if ftype is None:
+        file_name = os.path.basename(nc_file_path)
+    else:
+        file_name = '{}.nc'.format(ftype)
     
     if file_name == 'model_an.nc' or file_name == 'eac4_ml.nc':
         new_ds = ds.rename({
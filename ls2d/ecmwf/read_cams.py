@@ -26,11 +26,11 @@ import sys, os
 import xarray as xr
 import pandas as pd
 import numpy as np
-from scipy import interpolate
 
 # LS2D modules
 from ls2d.src.messages import *
 import ls2d.src.spatial_tools as spatial
+import ls2d.src.interpolation as interp
 import ls2d.ecmwf.era_tools as era_tools
 from ls2d.ecmwf.IFS_tools import IFS_tools
 from ls2d.ecmwf.patch_cds_ads import patch_netcdf
@@ -63,12 +63,8 @@ class Read_cams:
         # Get list of required forecast and analysis times
         an_dates = era_tools.get_required_analysis(self.start, self.end, freq=3)
 
-        # Check if output directory ends with '/'
-        if self.settings['cams_path'][-1] != '/':
-            self.settings['cams_path'] += '/'
-
         # Create lists with required files
-        path = self.settings['cams_path']
+        path = era_tools.normalize_path(self.settings['cams_path'])
         case = self.settings['case_name']
 
         # Populate list of NetCDF files for each CAMS file type.
@@ -119,14 +115,8 @@ class Read_cams:
         # Short-cut
         ds = self.ds_ml
 
-        dims = self.ds_ml.dims
         dim_name = ['time', 'level', 'latitude', 'longitude']
 
-        ntime = dims['time']
-        nlevel = dims['level']
-        nlon = dims['longitude']
-        nlat = dims['latitude']
-
         # Help class for vertical grid calculations IFS.
         ifs_tools = IFS_tools('L60')
 
@@ -134,15 +124,10 @@ class Read_cams:
         Tv = ifs_tools.calc_virtual_temp(ds.t.values, ds.q.values)
 
         # Calculate half level pressure and height.
-        dim_size_h = [ntime, nlevel+1, nlat, nlon]
-        ph = np.zeros(dim_size_h, np.float32)
-        zh = np.zeros(dim_size_h, np.float32)
+        ph, zh = ifs_tools.calc_half_level_pressure_Zg(ds.sp.values, Tv)
 
-        for t in range(ntime):
-            for j in range(nlat):
-                for i in range(nlon):
-                    ph[t,:,j,i] = ifs_tools.calc_half_level_pressure(float(ds.sp[t,j,i]))
-                    zh[t,:,j,i] = ifs_tools.calc_half_level_Zg(ph[t,:,j,i], Tv[t,:,j,i])
+        ph = ph.astype(np.float32)
+        zh = zh.astype(np.float32)
 
         # Full level pressure and height as interpolation of the half level values
         p = 0.5 * (ph[:,1:,:,:] + ph[:,:-1:,:])
@@ -163,8 +148,8 @@ class Read_cams:
         clon = self.settings['central_lon']
         clat = self.settings['central_lat']
     
-        ic = int(np.abs(self.ds_ml.longitude - clon).argmin())
-        jc = int(np.abs(self.ds_ml.latitude  - clat).argmin())
+        ic = interp.nearest_index(self.ds_ml.longitude.values, clon)
+        jc = interp.nearest_index(self.ds_ml.latitude.values,  clat)
     
         # Some debugging output
         distance = spatial.haversine(self.ds_ml.longitude[ic], self.ds_ml.latitude[jc], clon, clat)
@@ -208,6 +193,7 @@ class Read_cams:
         # the variable names in NetCDF, it is difficult to link them without a huge lookup
         # table containing **ALL** possible CAMS variables...
         blacklist = ['level', 'time']
+        z_cams = self.ds_ml_mean['z'].values
     
         for name, da in self.ds_ml_mean.data_vars.items():
             if name not in blacklist and da.ndim == 2:
@@ -216,12 +202,12 @@ class Read_cams:
                 self.ds_les[f'{name}_lay'] = (dims_lay, da.values)
     
                 if name != 'z':
-                    # Interpolate data onto LES grid.
+                    # Interpolate data onto LES grid, with linear extrapolation.
                     out = np.empty((ntime, ktot), np.float32)
+                    values = da.values
     
                     for t in range(ntime):
-                        out[t,:] = interpolate.interp1d(
-                                self.ds_ml_mean['z'][t,:].values, da[t,:].values, fill_value='extrapolate')(z)
+                        out[t,:] = interp.interp_extrap(z, z_cams[t,:], values[t,:])
     
                     self.ds_les[name] = (dims_les, out)
 
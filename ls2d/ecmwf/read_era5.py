@@ -20,17 +20,19 @@
 
 # Python modules
 import datetime
+import warnings
 import sys, os
 
 # Third party modules
 import netCDF4 as nc4
 import xarray as xr
 import numpy as np
-from scipy import interpolate
 
 # LS2D modules
 import ls2d.src.spatial_tools as spatial
 import ls2d.src.finite_difference as fd
+import ls2d.src.interpolation as interp
+from ls2d.src.jit import has_numba
 from ls2d.src.messages import *
 
 import ls2d.ecmwf.era_tools as era_tools
@@ -47,28 +49,149 @@ ifs_tools = IFS_tools('L137')
 
 
 class Slice:
-    def __init__(self, istart, iend, jstart, jend):
+    """
+    Slicing tuples of the averaging domain, shifted by (dj, di) grid points.
+    The tuples for shifts of up to +/- `n_shift` points are created once.
+    """
+    def __init__(self, istart, iend, jstart, jend, n_shift=2):
         self.istart = istart
         self.iend   = iend
         self.jstart = jstart
         self.jend   = jend
 
-    def __call__(self, dj, di):
+        shifts = range(-n_shift, n_shift+1)
+        self.slices = {(dj, di): self.create(dj, di) for dj in shifts for di in shifts}
+
+    def create(self, dj, di):
         return np.s_[:,:,self.jstart+dj:self.jend+dj,\
                          self.istart+di:self.iend+di]
 
+    def __call__(self, dj, di):
+        try:
+            return self.slices[(dj, di)]
+        except KeyError:
+            return self.create(dj, di)
+
+
+def flip(array):
+    """
+    Flip the height and/or latitude dimensions.
+    Negative-stride slicing returns views, without copying the data.
+    """
+    if array.ndim == 4:
+        # Reverse order of 4-dimensional field (time, height, lat, lon)
+        # in height (axis=1) and lat (axis=2) direction
+        return array[:, ::-1, ::-1, :]
+    elif array.ndim == 3:
+        # Reverse order of 3-dimensional field (time, lat, lon)
+        # in lat (axis=1) direction
+        return array[:, ::-1, :]
+    elif array.ndim == 1:
+        # Reverse order of 1-dimensional field (height)
+        return array[::-1]
+
+
+def get_variable(nc, var, dslice, wrap_func=None, dtype=np.float32):
+    """
+    Read NetCDF variable, and flip height and latitude dimensions.
+    Optionally, apply the `wrap_func` function on the data.
+    The data is cast to `dtype`, by default single precision; the
+    (packed) ERA5 data is far less accurate than float32.
+    """
+    data = flip(nc.variables[var][dslice])
+    # Apply wrapper function (if provided):
+    data = wrap_func(data) if wrap_func is not None else data
+    # Cast to requested data type, and return as normal (not masked) C-contiguous array.
+    # NumPy promotes masked arrays to double precision when combined with Python floats,
+    # and the flipped (negative stride) views make the reductions over lat/lon slower.
+    # Missing values (e.g. `sst` over land) are set to NaN, and excluded from the domain means.
+    if np.issubdtype(dtype, np.floating):
+        data = np.ma.filled(data, np.nan)
+    data = np.ascontiguousarray(np.ma.getdata(data), dtype=dtype)
+
+    return data
+
+
+class Multi_file_variable:
+    """
+    NetCDF variable spread over multiple files, which are concatenated along `aggdim`.
+    """
+    def __init__(self, datasets, offsets, name, aggdim, chunk_cache):
+        self.vars = [ds.variables[name] for ds in datasets]
+        self.offsets = offsets
+        self.dimensions = self.vars[0].dimensions
+        self.is_aggregated = len(self.dimensions) > 0 and self.dimensions[0] == aggdim
+
+        if self.is_aggregated:
+            for var in self.vars:
+                var.set_var_chunk_cache(size=chunk_cache, preemption=0.75)
+
+    def __getitem__(self, key):
+        if not self.is_aggregated:
+            return self.vars[0][key]
+
+        key = key if isinstance(key, tuple) else (key,)
+        start, stop, step = key[0].indices(self.offsets[-1])
+        if step != 1:
+            error('Only contiguous slices are supported along the aggregation dimension')
+
+        # Read the overlapping part of each file.
+        data = []
+        for var, o0, o1 in zip(self.vars, self.offsets[:-1], self.offsets[1:]):
+            t0 = max(start, o0)
+            t1 = min(stop, o1)
+            if t1 > t0:
+                data.append(var[(np.s_[t0-o0:t1-o0],) + key[1:]])
+
+        return np.ma.concatenate(data, axis=0)
+
+
+class Multi_file_dataset:
+    """
+    Minimal replacement for `nc4.MFDataset`, which reads from the individual
+    files with `nc4.Dataset`. Unlike `MFDataset`, this supports all NetCDF4 files
+    and sets the HDF5 chunk cache (`chunk_cache` bytes) of the aggregated variables.
+    """
+    def __init__(self, files, aggdim='time', chunk_cache=64*1024**2):
+        self.datasets = [nc4.Dataset(f) for f in files]
+        self.dimensions = self.datasets[0].dimensions
+
+        sizes = [ds.dimensions[aggdim].size for ds in self.datasets]
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+        self.variables = {
+                name: Multi_file_variable(self.datasets, offsets, name, aggdim, chunk_cache)
+                for name in self.datasets[0].variables}
+
+
 class Read_era5:
     """
     Read the ERA5 model/pressure/surface level data,
     and optionally calculate the LES/SCM forcings
     """
 
-    def __init__(self, settings):
+    def __init__(self, settings, window=None):
+        """
+        Arguments:
+            settings : dictionary
+                LS2D settings (see README).
+            window : int, optional (default = None)
+                Only read a window of +/- `window` grid points around the
+                central lat/lon. Has to be at least `n_av+1` (2nd order) or
+                `n_av+2` (4th order) of `calculate_forcings()`, and has to fit
+                in the downloaded domain. By default, the full spatial domain is read.
+        """
 
         self.settings = settings
+        self.window = window
         self.start = settings['start_date']
         self.end   = settings['end_date']
 
+        # Pressure level data, only read if required (see `fpa`, `z_p` and `p_p`).
+        self._fpa = None
+        self._z_p = None
+        self._p_p = None
+
         # Open all required NetCDF files:
         self.open_netcdf_files()
 
@@ -89,12 +212,8 @@ class Read_era5:
         an_dates = era_tools.get_required_analysis(self.start, self.end)
         fc_dates = era_tools.get_required_forecast(self.start, self.end)
 
-        # Check if output directory ends with '/'
-        if self.settings['era5_path'][-1] != '/':
-            self.settings['era5_path'] += '/'
-
         # Create lists with required files
-        path = self.settings['era5_path']
+        path = era_tools.normalize_path(self.settings['era5_path'])
         case = self.settings['case_name']
 
         an_sfc_files   = [era_tools.era5_file_path(
@@ -129,49 +248,52 @@ class Read_era5:
                 ds.close()
                 patch_netcdf(f)
 
-        # Open NetCDF files: MFDataset automatically merges the files / time dimensions
-        self.fsa = nc4.MFDataset(an_sfc_files,   aggdim='time')
-        self.fma = nc4.MFDataset(an_model_files, aggdim='time')
-        self.fpa = nc4.MFDataset(an_pres_files,  aggdim='time')
+        # Open NetCDF files, merging the files along the time dimension
+        self.fsa = Multi_file_dataset(an_sfc_files,   aggdim='time')
+        self.fma = Multi_file_dataset(an_model_files, aggdim='time')
 
+        # The pressure level files are only needed for the geostrophic wind,
+        # and are opened on first access of `fpa`.
+        self._an_pres_files = an_pres_files
 
-    def read_data(self):
+
+    @property
+    def fpa(self):
         """
-        Read all the required variables from the NetCDF files
+        Pressure level files, opened on first access.
         """
+        if self._fpa is None:
+            self._fpa = Multi_file_dataset(self._an_pres_files, aggdim='time')
+        return self._fpa
 
-        def flip(array):
-            """
-            Flip the height and/or latitude dimensions
-            """
-            if len(array.shape) == 4:
-                # Reverse order of 4-dimensional field (time, height, lat, lon)
-                # in height (axis=1) and lat (axis=2) direction
-                return np.flip(np.flip(array, axis=1), axis=2)
-            elif len(array.shape) == 3:
-                # Reverse order of 3-dimensional field (time, lat, lon)
-                # in lat (axis=1) direction
-                return np.flip(array, axis=1)
-            elif len(array.shape) == 1:
-                # Reverse order of 1-dimensional field (height)
-                return np.flip(array, axis=0)
-
-
-        def get_variable(nc, var, dslice, wrap_func=None, dtype=None):
-            """
-            Read NetCDF variable, and flip height and latitude dimensions.
-            Optionally, apply the `wrap_func` function on the data,
-            and/or cast data to requested `dtype`.
-            """
-            data = flip(nc.variables[var][dslice])
-            # Apply wrapper function (if provided):
-            data = wrap_func(data) if wrap_func is not None else data
-            # Cast to requested data type (if provided):
-            data = data.astype(dtype) if dtype is not None else data
 
-            return data
+    @property
+    def z_p(self):
+        """
+        Geopotential height on pressure levels (m), read on first access.
+        The geostrophic wind is calculated from small horizontal differences
+        in the (large) geopotential, so keep it in double precision.
+        """
+        if self._z_p is None:
+            self._z_p = get_variable(self.fpa, 'z', self._s3d, dtype=np.float64) / ifs_tools.grav
+        return self._z_p
 
 
+    @property
+    def p_p(self):
+        """
+        Pressure levels (Pa), read on first access.
+        """
+        if self._p_p is None:
+            self._p_p = get_variable(self.fpa, 'level', np.s_[:]) * 100
+        return self._p_p
+
+
+    def read_data(self):
+        """
+        Read all the required variables from the NetCDF files
+        """
+
         # Full time records in analysis and forecast files
         an_time_tmp = self.fsa.variables['time'][:]
 
@@ -181,15 +303,38 @@ class Read_era5:
         start_h_since = (self.start - date_00).total_seconds()/3600.
         end_h_since   = (self.end   - date_00).total_seconds()/3600.
 
-        t0_an = np.abs(an_time_tmp - start_h_since).argmin()
-        t1_an = np.abs(an_time_tmp - end_h_since  ).argmin()
+        t0_an = interp.nearest_index(an_time_tmp, start_h_since)
+        t1_an = interp.nearest_index(an_time_tmp, end_h_since  )
 
         # Time slices
         t_an = np.s_[t0_an:t1_an+1]
 
+        # Spatial slices; either the full domain, or a window around the central lat/lon.
+        if self.window is None:
+            s_lat = np.s_[:]
+            s_lon = np.s_[:]
+        else:
+            lats = self.fma.variables['latitude'][:]
+            lons = self.fma.variables['longitude'][:]
+            lons = np.where(lons > 180, lons-360, lons)
+
+            if lons.size > 1 and np.any(np.diff(lons) <= 0):
+                error('`window` of Read_era5 is not supported for domains crossing the 180° meridian')
+
+            j = interp.nearest_index(lats, self.settings['central_lat'])
+            i = interp.nearest_index(lons, self.settings['central_lon'])
+
+            if j-self.window < 0 or j+self.window >= lats.size or \
+               i-self.window < 0 or i+self.window >= lons.size:
+                error('`window` of Read_era5 ({}) does not fit in the ERA5 domain; '
+                      'increase `area_size` or decrease `window`'.format(self.window))
+
+            s_lat = np.s_[j-self.window : j+self.window+1]
+            s_lon = np.s_[i-self.window : i+self.window+1]
+
         # Read spatial and time variables
-        self.lats = self.fma.variables['latitude'][::-1]
-        self.lons = self.fma.variables['longitude'][:]
+        self.lats = self.fma.variables['latitude'][s_lat][::-1]
+        self.lons = self.fma.variables['longitude'][s_lon]
 
         # Read time, and check if all files are synced.
         self.time = self.fma.variables['time'][t_an]
@@ -212,16 +357,14 @@ class Read_era5:
         # Grid and time dimensions
         self.nfull = self.fma.dimensions['level'].size
         self.nhalf = self.nfull+1
-        self.nlat  = self.fma.dimensions['latitude'].size
-        self.nlon  = self.fma.dimensions['longitude'].size
+        self.nlat  = self.lats.size
+        self.nlon  = self.lons.size
         self.ntime = self.time.size
 
         # Read the full fields, reversing (flip) the height axis from top-to-bottom
         # to bottom-to-top, and reversing the latitude dimension
-        s1d  = np.s_[:         ]    # Slice for 1D fields
-        s2d  = np.s_[t_an,:,:  ]    # Slice for 2D (surface) fields
-        s3d  = np.s_[t_an,:,:,:]    # Slice for 3D (atmospheric) fields
-        s3ds = np.s_[t_an,0,:,:]    # Slice for surface plane of 3D field
+        s2d  = np.s_[t_an,  s_lat,s_lon]    # Slice for 2D (surface) fields
+        s3d  = np.s_[t_an,:,s_lat,s_lon]    # Slice for 3D (atmospheric) fields
 
         # Model level analysis data:
         self.u  = get_variable(self.fma, 'u',    s3d)  # v-component wind (m s-1)
@@ -231,10 +374,14 @@ class Read_era5:
         self.q  = get_variable(self.fma, 'q',    s3d)  # Specific humidity (kg kg-1)
         self.qc = get_variable(self.fma, 'clwc', s3d)  # Specific cloud liquid water content (kg kg-1)
         self.qi = get_variable(self.fma, 'ciwc', s3d)  # Specific cloud ice content (kg kg-1)
-        self.qr = get_variable(self.fma, 'crwc', s3d)  # Specific rain water content (kg kg-1)
-        self.qs = get_variable(self.fma, 'cswc', s3d)  # Specific snow content (kg kg-1)
         self.o3 = get_variable(self.fma, 'o3',   s3d)  # Ozone (kg kg-1)
 
+        # Rain and snow are only needed for the total liquid/solid specific humidity (kg kg-1).
+        # Add them directly (in-place) to `ql`, instead of storing them.
+        self.ql  = self.qc + self.qi
+        self.ql += get_variable(self.fma, 'crwc', s3d)  # Specific rain water content (kg kg-1)
+        self.ql += get_variable(self.fma, 'cswc', s3d)  # Specific snow content (kg kg-1)
+
         # Surface variables:
         self.sst =  get_variable(self.fsa, 'sst',  s2d)  # Sea surface temperature (K)
         self.Ts  =  get_variable(self.fsa, 'skt',  s2d)  # Skin temperature (K)
@@ -254,23 +401,22 @@ class Read_era5:
         self.cveg_low  = get_variable(self.fsa, 'cvl', s2d)  # Low vegetation cover (-)
         self.cveg_high = get_variable(self.fsa, 'cvh', s2d)  # High vegetation cover (-)
 
-        # Soil variables:
-        self.T_soil1 = get_variable(self.fsa, 'stl1', s2d)  # Top soil layer temperature (K)
-        self.T_soil2 = get_variable(self.fsa, 'stl2', s2d)  # 2nd soil layer temperature (K)
-        self.T_soil3 = get_variable(self.fsa, 'stl3', s2d)  # 3rd soil layer temperature (K)
-        self.T_soil4 = get_variable(self.fsa, 'stl4', s2d)  # Bottom soil layer temperature (K)
+        # Soil variables; read each layer directly into the (time, layer, lat, lon) arrays,
+        # instead of keeping the separate layers in memory.
+        self.z_soil = np.array([-0.035, -0.175, -0.64, -1.945])
+        self.T_soil = np.empty((self.ntime, 4, self.nlat, self.nlon), np.float32)
+        self.theta_soil = np.empty((self.ntime, 4, self.nlat, self.nlon), np.float32)
 
-        self.theta_soil1 = get_variable(self.fsa, 'swvl1', s2d)  # Top soil layer moisture (-)
-        self.theta_soil2 = get_variable(self.fsa, 'swvl2', s2d)  # 2nd soil layer moisture (-)
-        self.theta_soil3 = get_variable(self.fsa, 'swvl3', s2d)  # 3rd soil layer moisture (-)
-        self.theta_soil4 = get_variable(self.fsa, 'swvl4', s2d)  # Bottom soil layer moistsure (-)
+        for k in range(4):
+            self.T_soil[:,k,:,:] = get_variable(self.fsa, f'stl{k+1}', s2d)  # Soil temperature (K)
+            self.theta_soil[:,k,:,:] = get_variable(self.fsa, f'swvl{k+1}', s2d)  # Soil moisture (-)
 
-        # Pressure level data:
-        self.z_p = get_variable(self.fpa, 'z', s3d) / ifs_tools.grav  # Geopotential height on pressure levels (m)
-        self.p_p = get_variable(self.fpa, 'level', s1d) * 100         # Pressure levels (Pa)
+        # Pressure level data (`z_p`, `p_p`) is only read when required
+        # by `calculate_forcings()`; store the slice for 3D fields.
+        self._s3d = s3d
 
-        # Convert ozone from mass mixing ratio to volume mixing ratio
-        self.o3 = 28.9644 / 47.9982 * self.o3 * 1e6
+        # Convert ozone from mass mixing ratio to volume mixing ratio (in-place)
+        self.o3 *= 28.9644 / 47.9982 * 1e6
 
 
     def calc_derived_data(self):
@@ -279,21 +425,15 @@ class Read_era5:
         prognostic variables used by LES, etc.
         """
 
-        self.ql  = self.qc + self.qi + self.qr + self.qs  # Total liquid/solid specific humidity (kg kg-1)
-        self.qt  = self.q + self.ql                       # Total specific humidity (kg kg-1)
-        self.Tv  = ifs_tools.calc_virtual_temp(
-                self.T, self.q, self.qc, self.qi, self.qr, self.qs)  # Virtual temp on full levels (K)
-
-        # Calculate half level pressure and heights
-        self.ph  = np.zeros((self.ntime, self.nhalf, self.nlat, self.nlon))  # Half level pressure (Pa)
-        self.zh  = np.zeros((self.ntime, self.nhalf, self.nlat, self.nlon))  # Half level geopotential height (m)
+        self.qt  = self.q + self.ql   # Total specific humidity (kg kg-1)
+        self.Tv  = ifs_tools.calc_virtual_temp(self.T, self.q, self.ql)  # Virtual temp on full levels (K)
 
-        # TO-DO: remove loops
-        for t in range(self.ntime):
-            for la in range(self.nlat):
-                for lo in range(self.nlon):
-                    self.ph[t,:,la,lo] = ifs_tools.calc_half_level_pressure(self.ps[t,la,lo])
-                    self.zh[t,:,la,lo] = ifs_tools.calc_half_level_Zg(self.ph[t,:,la,lo], self.Tv[t,:,la,lo])
+        # Calculate half level pressure (Pa) and geopotential height (m).
+        # The vertical integration is done in double precision.
+        ph, zh = ifs_tools.calc_half_level_pressure_Zg(self.ps, self.Tv)
+        self.ph = np.ascontiguousarray(ph, dtype=np.float32)
+        self.zh = np.ascontiguousarray(zh, dtype=np.float32)
+        del ph, zh
 
         # Full level pressure and height as interpolation of the half level values
         self.p  = 0.5 * (self.ph[:,1:,:,:] + self.ph[:,:-1:,:])  # Full level pressure (Pa)
@@ -301,11 +441,14 @@ class Read_era5:
 
         # Other derived quantities
         self.exn  = ifs_tools.calc_exner(self.p)  # Exner on full model levels (-)
-        self.th   = (self.T / self.exn)  # Potential temperature (K)
-        self.thl  = self.th - ifs_tools.Lv / (ifs_tools.cpd * self.exn) * self.ql  # Liquid water potential temperature (K)
+        inv_exn   = 1. / self.exn
+        self.th   = self.T * inv_exn  # Potential temperature (K)
+        self.thl  = self.th - (ifs_tools.Lv / ifs_tools.cpd) * self.ql * inv_exn  # Liquid water potential temperature (K)
+        del inv_exn
         self.rho  = self.p / (ifs_tools.Rd * self.Tv)  # Density at full levels (kg m-3)
-        self.wls  = -self.w / (self.rho * ifs_tools.grav)  # Vertical velocity (m s-1)
-        self.U    = (self.u**2. + self.v**2)**0.5  # Absolute horizontal wind (m s-1)
+        self.wls  = self.w / self.rho  # Vertical velocity (m s-1)
+        self.wls *= -1. / ifs_tools.grav
+        self.U    = np.hypot(self.u, self.v)  # Absolute horizontal wind (m s-1)
 
         self.Tvs  = ifs_tools.calc_virtual_temp(self.Ts, self.q[:,0])  # Estimate surface Tv using lowest model q (...)
         self.rhos = self.ph[:,0] / (ifs_tools.Rd * self.Tvs)  # Surface density (kg m-3)
@@ -314,31 +457,29 @@ class Read_era5:
 
         self.fc = 2 * 7.2921e-5 * np.sin(np.deg2rad(self.settings['central_lat']))  # Coriolis parameter
 
-        # Store soil temperature, and moisture content, in 3D array
-        self.z_soil = np.array([-0.035, -0.175, -0.64, -1.945])
-        self.T_soil = np.zeros((self.ntime, 4, self.nlat, self.nlon))
-        self.theta_soil = np.zeros((self.ntime, 4, self.nlat, self.nlon))
-
-        self.T_soil[:,0,:,:] = self.T_soil1[:,:,:]
-        self.T_soil[:,1,:,:] = self.T_soil2[:,:,:]
-        self.T_soil[:,2,:,:] = self.T_soil3[:,:,:]
-        self.T_soil[:,3,:,:] = self.T_soil4[:,:,:]
-
-        self.theta_soil[:,0,:,:] = self.theta_soil1[:,:,:]
-        self.theta_soil[:,1,:,:] = self.theta_soil2[:,:,:]
-        self.theta_soil[:,2,:,:] = self.theta_soil3[:,:,:]
-        self.theta_soil[:,3,:,:] = self.theta_soil4[:,:,:]
-
 
     def calculate_forcings(self, n_av=0, method='4th'):
         """
         Calculate the advective tendencies, geostrophic wind, et cetera.
+
+        The results are stored as `*_mean` attributes (used by `get_les_input()`),
+        and the method dependent forcings are also returned as a dictionary.
+        This allows comparing different `method` or `n_av` settings on the same
+        `Read_era5` instance, without (deep) copying the instance between calls.
         """
         header('Calculating large-scale forcings')
 
         # Find nearest location on (regular lat/lon) grid
-        self.i = np.abs(self.lons - self.settings['central_lon']).argmin()
-        self.j = np.abs(self.lats - self.settings['central_lat']).argmin()
+        self.i = interp.nearest_index(self.lons, self.settings['central_lon'])
+        self.j = interp.nearest_index(self.lats, self.settings['central_lat'])
+
+        # Check if the averaging domain plus the stencil of the gradients fits in the spatial domain.
+        n_halo = n_av+2 if method == '4th' else n_av+1
+        if self.j-n_halo < 0 or self.j+n_halo >= self.nlat or \
+           self.i-n_halo < 0 or self.i+n_halo >= self.nlon:
+            error('Averaging domain (n_av={}) plus stencil (method=\"{}\") requires +/- {} grid points '
+                  'around the central lat/lon; increase `area_size` (or `window` of Read_era5)'.format(
+                      n_av, method, n_halo))
 
         # Some debugging output
         distance = spatial.haversine(
@@ -365,22 +506,42 @@ class Read_era5:
         center4d = np.s_[:,:,jstart:jend,istart:iend]
         center3d = np.s_[:,  jstart:jend,istart:iend]
 
+        def calc_domain_mean(variables, center):
+            """
+            Calculate mean over averaging domain. Variables with the same
+            shape are stacked, and averaged with a single reduction.
+            Missing values (NaN) are excluded from the mean.
+            """
+            groups = {}
+            for var in variables:
+                groups.setdefault(getattr(self, var).shape, []).append(var)
+
+            for group in groups.values():
+                data = np.stack([getattr(self, var)[center] for var in group])
+
+                if np.issubdtype(data.dtype, np.floating) and np.isnan(data).any():
+                    # Fully missing (e.g. `sst` over land) results in NaN, without warning.
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', RuntimeWarning)
+                        means = np.nanmean(data, axis=(-2,-1))
+                else:
+                    means = data.mean(axis=(-2,-1))
+
+                for var, mean in zip(group, means):
+                    setattr(self, '{}_mean'.format(var), mean)
+
         # Variables averaged from (time, height, lon, lat) to (time, height):
         var_4d_mean = [
                 'z', 'zh', 'p', 'ph', 'T', 'thl', 'qt', 'qc', 'qi',
                 'u', 'v', 'U', 'wls', 'rho', 'o3',
                 'T_soil', 'theta_soil']
-        for var in var_4d_mean:
-            mean = getattr(self, var)[center4d].mean(axis=(2,3))
-            setattr(self, '{}_mean'.format(var), mean)
+        calc_domain_mean(var_4d_mean, center4d)
 
         # Variables averaged from (time, lon, lat) to (time):
         var_3d_mean = [
-                'ps', 'Ts', 'sst', 'wths', 'wqs', 'ps', 'rhos',
+                'ps', 'Ts', 'sst', 'wths', 'wqs', 'rhos',
                 'lai_low', 'lai_high', 'z0m', 'z0h', 'cveg_low', 'cveg_high']
-        for var in var_3d_mean:
-            mean = getattr(self, var)[center3d].mean(axis=(1,2))
-            setattr(self, '{}_mean'.format(var), mean)
+        calc_domain_mean(var_3d_mean, center3d)
 
         # Variables selected as nearest-neighbour
         var_nn = ['soil_type', 'veg_type_low', 'veg_type_high']
@@ -428,11 +589,17 @@ class Read_era5:
             dxdi[:,:] = r_earth * cos_lat[:,None]*np.gradient(lon_rad[None, :], axis=1)
             dydj[:,:] = r_earth * np.gradient(lat_rad[:, None], axis=0)
 
-            def advec(var):
-                dvardx = np.gradient(var, axis=3) / dxdi[None, None, :, :]
-                dvardy = np.gradient(var, axis=2) / dydj[None, None, :, :]
-                dtvar  = -self.u * dvardx - self.v * dvardy
-                return dtvar[center4d].mean(axis=(2,3))
+            if has_numba:
+                def advec(var):
+                    return fd.advec_mean(
+                            np.asarray(self.u), np.asarray(self.v), np.asarray(var),
+                            fd.coef2c, 1/dxdi, 1/dydj, istart, iend, jstart, jend)
+            else:
+                def advec(var):
+                    dvardx = np.gradient(var, axis=3) / dxdi[None, None, :, :]
+                    dvardy = np.gradient(var, axis=2) / dydj[None, None, :, :]
+                    dtvar  = -self.u * dvardx - self.v * dvardy
+                    return dtvar[center4d].mean(axis=(2,3))
 
             # Calculate advective tendencies:
             self.dtthl_advec_mean = advec(self.thl)
@@ -451,51 +618,38 @@ class Read_era5:
             vg_p_mean = self.vg_p[center4d].mean(axis=(2,3))
 
             # Bonus for large domains; spatial (ug,vg) on model levels.
-            # Use Scipy's interpolation, as it can extrapolate (in case ps > 1000 hPa)
-            self.ug = np.zeros_like(self.u)
-            self.vg = np.zeros_like(self.u)
-
-            for t in range(self.ntime):
-                for j in range(self.nlat):
-                    for i in range(self.nlon):
-                        self.ug[t,:,j,i] = interpolate.interp1d(
-                            self.p_p, self.ug_p[t,:,j,i], fill_value='extrapolate')(self.p[t,:,j,i])
-                        self.vg[t,:,j,i] = interpolate.interp1d(
-                            self.p_p, self.vg_p[t,:,j,i], fill_value='extrapolate')(self.p[t,:,j,i])
+            # Linear extrapolation is needed in case ps > 1000 hPa.
+            self.ug = interp.interp_extrap(self.p, self.p_p, self.ug_p, axis=1)
+            self.vg = interp.interp_extrap(self.p, self.p_p, self.vg_p, axis=1)
 
 
         elif (method == '4th'):
 
             s = Slice(istart, iend, jstart, jend)
 
+            # Wind components at the center points, shared by all tendencies
+            u_c = self.u[s(0,0)]
+            v_c = self.v[s(0,0)]
+
+            if has_numba:
+                dxi = np.full((self.nlat, self.nlon), 1/dx)
+                dyi = np.full((self.nlat, self.nlon), 1/dy)
+
+                def advec(var):
+                    return fd.advec_mean(
+                            np.asarray(self.u), np.asarray(self.v), np.asarray(var),
+                            fd.coef4c, dxi, dyi, istart, iend, jstart, jend)
+            else:
+                def advec(var):
+                    dvardx = fd.grad4c(var[s(0,-2)], var[s(0,-1)], var[s(0,+1)], var[s(0,+2)], dx)
+                    dvardy = fd.grad4c(var[s(-2,0)], var[s(-1,0)], var[s(+1,0)], var[s(+2,0)], dy)
+                    return (-u_c * dvardx - v_c * dvardy).mean(axis=(2,3))
+
             # Calculate advective tendencies
-            self.dtthl_advec_mean = (
-                -self.u[s(0,0)] * fd.grad4c(
-                    self.thl[s(0,-2)], self.thl[s(0,-1)], self.thl[s(0,+1)], self.thl[s(0,+2)], dx) \
-                -self.v[s(0,0)] * fd.grad4c(
-                    self.thl[s(-2,0)], self.thl[s(-1,0)], self.thl[s(+1,0)], self.thl[s(+2,0)], dy)
-                                    ).mean(axis=(2,3))
-
-            self.dtqt_advec_mean =  (
-                -self.u[s(0,0)] * fd.grad4c(
-                    self.qt[s(0,-2)], self.qt[s(0,-1)], self.qt[s(0,+1)], self.qt[s(0,+2)], dx) \
-                -self.v[s(0,0)] * fd.grad4c(
-                    self.qt[s(-2,0)], self.qt[s(-1,0)], self.qt[s(+1,0)], self.qt[s(+2,0)], dy)
-                                    ).mean(axis=(2,3))
-
-            self.dtu_advec_mean = (
-                -self.u[s(0,0)] * fd.grad4c(
-                    self.u[s(0,-2)], self.u[s(0,-1)], self.u[s(0,+1)], self.u[s(0,+2)], dx) \
-                -self.v[s(0,0)] * fd.grad4c(
-                    self.u[s(-2,0)], self.u[s(-1,0)], self.u[s(+1,0)], self.u[s(+2,0)], dy)
-                                  ).mean(axis=(2,3))
-
-            self.dtv_advec_mean = (
-                -self.u[s(0,0)] * fd.grad4c(
-                    self.v[s(0,-2)], self.v[s(0,-1)], self.v[s(0,+1)], self.v[s(0,+2)], dx) \
-                -self.v[s(0,0)] * fd.grad4c(
-                    self.v[s(-2,0)], self.v[s(-1,0)], self.v[s(+1,0)], self.v[s(+2,0)], dy)
-                                  ).mean(axis=(2,3))
+            self.dtthl_advec_mean = advec(self.thl)
+            self.dtqt_advec_mean  = advec(self.qt)
+            self.dtu_advec_mean   = advec(self.u)
+            self.dtv_advec_mean   = advec(self.v)
 
             # Geostrophic wind (gradient geopotential height on constant pressure levels)
             vg_p_mean = (
@@ -509,15 +663,9 @@ class Read_era5:
 
 
         # Interpolate geostrophic wind onto model grid.
-        # Use Scipy's interpolation, as it can extrapolate (in case ps > 1000 hPa)
-        self.ug_mean = np.zeros_like(self.p_mean)
-        self.vg_mean = np.zeros_like(self.p_mean)
-
-        for t in range(self.ntime):
-            self.ug_mean[t,:] = interpolate.interp1d(
-                    self.p_p, ug_p_mean[t,:], fill_value='extrapolate')(self.p_mean[t,:])
-            self.vg_mean[t,:] = interpolate.interp1d(
-                    self.p_p, vg_p_mean[t,:], fill_value='extrapolate')(self.p_mean[t,:])
+        # Linear extrapolation is needed in case ps > 1000 hPa.
+        self.ug_mean = interp.interp_extrap(self.p_mean, self.p_p, ug_p_mean)
+        self.vg_mean = interp.interp_extrap(self.p_mean, self.p_p, vg_p_mean)
 
         # Momentum tendency coriolis
         self.dtu_coriolis_mean = +self.fc * (self.v_mean - self.vg_mean)
@@ -558,6 +706,14 @@ class Read_era5:
             self.root_frac_low_nn = np.zeros(4)-1
             self.root_frac_high_nn = np.zeros(4)-1
 
+        forcings = ['dtthl_advec_mean', 'dtqt_advec_mean', 'dtu_advec_mean', 'dtv_advec_mean',
+                    'ug_mean', 'vg_mean', 'dtu_coriolis_mean', 'dtv_coriolis_mean',
+                    'dtu_total_mean', 'dtv_total_mean']
+        if method == '2nd':
+            forcings += ['ug', 'vg']
+
+        return {name: getattr(self, name) for name in forcings}
+
 
     def get_les_input(self, z):
         """
@@ -565,6 +721,9 @@ class Read_era5:
         and return xarray.Dataset with all possible LES input
         """
 
+        # Convert LES grid once; `np.interp` works in double precision.
+        z = np.ascontiguousarray(z, dtype=np.float64)
+
         def interp_z(array, z):
             out = np.empty((self.ntime, z.size))
             for t in range(self.ntime):
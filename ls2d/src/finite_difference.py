@@ -18,6 +18,17 @@
 # along with LS2D.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+# Third party modules
+import numpy as np
+
+# LS2D modules
+from ls2d.src.jit import njit, prange
+
+# Coefficients of the centered gradients `grad2c` and `grad4c`, as
+# stencils around X (multiplied by `1/delta` to obtain the gradient).
+coef2c = np.array([-1., 0., 1.]) / 2.
+coef4c = np.array([1., -8., 0., 8., -1.]) / 12.
+
 def grad2(a, b, delta):
     """
     2nd order accurate gradient at location of X:
@@ -65,3 +76,49 @@ def grad4c(a, b, c, d, delta):
     """
 
     return (a - 8*b + 8*c - d) / (12*delta)
+
+@njit(parallel=True, cache=True)
+def advec_mean(u, v, var, coef, dxi, dyi, istart, iend, jstart, jend):
+    """
+    Advective tendency `-u * dvar/dx - v * dvar/dy`, averaged over
+    the domain `[jstart:jend, istart:iend]`, in a single pass.
+
+    Arguments:
+        u, v, var : np.ndarray, shape (time, level, lat, lon)
+            Wind components and advected variable.
+        coef : np.ndarray
+            Centered finite difference coefficients (e.g. `coef2c` or `coef4c`).
+        dxi, dyi : np.ndarray, shape (lat, lon)
+            Inverse grid spacing in x and y direction.
+        istart, iend, jstart, jend : int
+            Averaging domain. The stencil has to fit in the arrays.
+
+    Returns:
+        Domain mean tendency, shape (time, level).
+    """
+
+    nt = var.shape[0]
+    nk = var.shape[1]
+    h = coef.size // 2
+    norm = 1. / ((jend-jstart) * (iend-istart))
+
+    out = np.empty((nt, nk))
+
+    for n in prange(nt*nk):
+        t = n // nk
+        k = n % nk
+
+        total = 0.
+        for j in range(jstart, jend):
+            for i in range(istart, iend):
+                dvardx = 0.
+                dvardy = 0.
+                for m in range(coef.size):
+                    dvardx += coef[m] * var[t,k,j,i+m-h]
+                    dvardy += coef[m] * var[t,k,j+m-h,i]
+
+                total += -u[t,k,j,i] * dvardx * dxi[j,i] - v[t,k,j,i] * dvardy * dyi[j,i]
+
+        out[t,k] = total * norm
+
+    return out
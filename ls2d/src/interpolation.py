@@ -0,0 +1,101 @@
+#
+# This file is part of LS2D.
+#
+# Copyright (c) 2017-2024 Wageningen University & Research
+# Author: Bart van Stratum (WUR)
+#
+# LS2D is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LS2D is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with LS2D.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Third party modules
+import numpy as np
+
+def interp_extrap(x, xp, fp, axis=-1):
+    """
+    Linear interpolation of `fp(xp)` to `x` along `axis`, with linear
+    extrapolation outside the range of `xp`. Vectorised equivalent of calling
+    `scipy.interpolate.interp1d(xp, fp, fill_value='extrapolate')(x)` per column.
+
+    Arguments:
+        x : np.ndarray
+            Output coordinates.
+        xp : np.ndarray
+            Input coordinates (1D, monotonic), shared by all columns.
+        fp : np.ndarray
+            Input values, with `xp.size` values along `axis`.
+        axis : int, optional (default = -1)
+            Interpolation axis of `x` and `fp`. The other dimensions have to broadcast.
+    """
+
+    xp = np.asarray(xp)
+    x  = np.moveaxis(np.asarray(x),  axis, -1)
+    fp = np.moveaxis(np.asarray(fp), axis, -1)
+
+    # Make sure that `xp` is increasing.
+    if xp[0] > xp[-1]:
+        xp = xp[::-1]
+        fp = fp[..., ::-1]
+
+    # Interval (k, k+1) of `xp` for each `x`. Values outside `xp`
+    # use the first or last interval, which results in linear extrapolation.
+    k = np.clip(np.searchsorted(xp, x) - 1, 0, xp.size-2)
+
+    shape = np.broadcast(x[..., :1], fp[..., :1]).shape[:-1]
+    k  = np.broadcast_to(k, shape + k.shape[-1:])
+    fp = np.broadcast_to(fp, shape + fp.shape[-1:])
+
+    x0 = xp[k]
+    x1 = xp[k+1]
+    f0 = np.take_along_axis(fp, k,   axis=-1)
+    f1 = np.take_along_axis(fp, k+1, axis=-1)
+
+    y = (f1 - f0) / (x1 - x0) * (x - x0) + f0
+
+    return np.moveaxis(y, -1, axis)
+
+
+def nearest_index(x, value):
+    """
+    Index of the element of `x` nearest to `value`. Equivalent to
+    `np.abs(x - value).argmin()` (including the choice of the first
+    element in `x` on ties), but uses a binary search instead of
+    creating a temporary array.
+
+    Arguments:
+        x : np.ndarray
+            Monotonic (increasing or decreasing) 1D array.
+        value : float
+            Value to search for.
+    """
+
+    x = np.asarray(x)
+
+    # Binary search requires increasing values.
+    descending = x.size > 1 and x[0] > x[-1]
+    xs = x[::-1] if descending else x
+
+    i = int(np.searchsorted(xs, value))
+
+    if i == 0:
+        k = 0
+    elif i == xs.size:
+        k = xs.size-1
+    else:
+        d0 = value - xs[i-1]
+        d1 = xs[i] - value
+        # On ties, `argmin` returns the first element in `x`, which
+        # is `xs[i-1]` for increasing, and `xs[i]` for decreasing `x`.
+        k = i if d1 < d0 or (d1 == d0 and descending) else i-1
+
+    return xs.size-1-k if descending else k
@@ -0,0 +1,38 @@
+#
+# This file is part of LS2D.
+#
+# Copyright (c) 2017-2024 Wageningen University & Research
+# Author: Bart van Stratum (WUR)
+#
+# LS2D is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LS2D is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with LS2D.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Optional Numba support. If Numba is not installed, `njit` returns the
+undecorated function and `prange` falls back to `range`; code using the
+kernels should check `has_numba` and use the NumPy version instead.
+"""
+
+try:
+    from numba import njit, prange
+    has_numba = True
+except ImportError:
+    has_numba = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        # Support both `@njit` and `@njit(...)`.
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func